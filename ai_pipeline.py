@@ -0,0 +1,120 @@
+"""
+AI Pipeline Module for the Fantasy RPG
+
+This module runs independent AI generation calls (text, image and audio)
+concurrently on a shared thread pool, which bounds how many calls a
+worker process runs at once. Every batch is bounded by a deadline: calls
+that miss it resolve to their placeholder result, so a request costs the
+slowest single call instead of the sum of all of them. The deadline of a
+call runs from the moment it starts, so time spent queued behind other
+requests' calls is not counted against it; a call still queued after a
+whole deadline is cancelled and falls back too. Calls run in a copy of
+the caller's context, so their metrics spans count for the request.
+"""
+
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Pipeline configuration
+PIPELINE_CONFIG = {
+    "max_workers": int(os.environ.get("AI_PIPELINE_WORKERS", 16)),  # Calls running at once, run_parallel and submit alike
+    "deadline_seconds": float(os.environ.get("AI_GENERATION_DEADLINE", 25))
+}
+
+# Shared pool for every call scheduled by this module in this worker process
+_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_CONFIG["max_workers"],
+    thread_name_prefix="ai-pipeline"
+)
+
+def submit(func, *args, **kwargs):
+    """
+    Schedule a single generation call on the shared pool
+
+    Args:
+        func: The callable to run
+        *args, **kwargs: Arguments for the callable
+
+    Returns:
+        Future: The future for the scheduled call
+    """
+    return _executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+def run_parallel(tasks, deadline=None):
+    """
+    Run independent generation calls in parallel within a deadline
+
+    The calls share the pool of AI_PIPELINE_WORKERS threads with every
+    other request. Each call gets the whole deadline from the moment a
+    thread picks it up; one that waits in the queue for a whole deadline is
+    cancelled. A batch therefore takes at most twice the deadline, and
+    only when the pool is saturated. Calls that miss the deadline keep
+    their thread until they return; their results are discarded.
+
+    Args:
+        tasks (dict): Maps a task name to a (callable, fallback) tuple. The
+            callable takes no arguments; the fallback is returned when the
+            call fails or misses the deadline
+        deadline (float, optional): Seconds each call may run, and wait
+            in the queue
+
+    Returns:
+        dict: Maps each task name to its result or fallback
+    """
+    if deadline is None:
+        deadline = PIPELINE_CONFIG["deadline_seconds"]
+
+    started = time.monotonic()
+    running_since = {}  # Task name -> when a thread picked it up
+
+    def timed(name, func):
+        def run():
+            running_since[name] = time.monotonic()
+            return func()
+        return run
+
+    futures = {name: submit(timed(name, func)) for name, (func, _) in tasks.items()}
+    pending = dict(futures)
+    expired = set()
+    while pending:
+        # A queued call's cutoff (start + deadline) comes before that of any
+        # call that already started, so waiting for the earliest is enough
+        cutoffs = {name: running_since.get(name, started) + deadline for name in pending}
+        wait(pending.values(), timeout=max(min(cutoffs.values()) - time.monotonic(), 0))
+        now = time.monotonic()
+        for name, future in list(pending.items()):
+            if future.done():
+                del pending[name]
+            elif name in running_since:
+                if now >= running_since[name] + deadline:
+                    expired.add(name)
+                    del pending[name]
+            elif now >= started + deadline and future.cancel():
+                # Still queued: it never runs (a call that just started
+                # cannot be cancelled and gets its own deadline)
+                expired.add(name)
+                del pending[name]
+
+    results = {}
+    for name, future in futures.items():
+        fallback = tasks[name][1]
+        if name in expired:
+            # A started call keeps running in the background; its result is discarded
+            logger.warning(f"Generation task '{name}' missed the {deadline}s deadline, using placeholder")
+            results[name] = fallback
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"Generation task '{name}' failed: {e}")
+            results[name] = fallback
+
+    logger.info(f"Generated {len(tasks)} tasks in {time.monotonic() - started:.2f}s")
+    return results
@@ -0,0 +1,237 @@
+"""
+AI Providers Module for the Fantasy RPG
+
+This module defines the backends behind ai_service. The OpenAI provider
+talks to the real API; the stub provider answers locally with deterministic
+outputs after a configurable simulated latency, so the full request path
+can be benchmarked or load-tested without any outside service.
+
+The backend is selected with AI_PROVIDER ("openai" or "stub"), read from
+the environment or from .env.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+
+from dotenv import dotenv_values
+
+import resilience
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+env_vars = dotenv_values('.env')
+
+# Provider configuration
+PROVIDER_CONFIG = {
+    "provider": os.environ.get("AI_PROVIDER", env_vars.get("AI_PROVIDER", "openai")),
+    # Simulated latency per endpoint, e.g. "chat=lognormal:0.8:0.4,image=uniform:2:6"
+    "stub_latency": os.environ.get("AI_STUB_LATENCY", env_vars.get("AI_STUB_LATENCY", "")),
+    "stub_seed": int(os.environ.get("AI_STUB_SEED", env_vars.get("AI_STUB_SEED", 0))),
+    "request_timeout": float(os.environ.get("AI_REQUEST_TIMEOUT", 30)),
+    # Wrap the provider in resilience.ResilientProvider; defaults to on for OpenAI only
+    "resilience": os.environ.get("AI_RESILIENCE")
+}
+
+class OpenAIProvider:
+    """Provider backed by the OpenAI API."""
+
+    name = "openai"
+
+    def __init__(self, api_key=None):
+        from openai import OpenAI
+
+        api_key = api_key or os.environ.get("OPENAI_API_KEY") or env_vars.get("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY is not configured")
+        # Retries are handled by resilience.ResilientProvider, so the client fails fast
+        self.client = OpenAI(api_key=api_key, max_retries=0, timeout=PROVIDER_CONFIG["request_timeout"])
+
+    def complete(self, messages, model, temperature, max_tokens=None):
+        """
+        Run a chat completion
+
+        Args:
+            messages (list): Chat messages
+            model (str): The model name
+            temperature (float): The sampling temperature
+            max_tokens (int, optional): Completion token limit
+
+        Returns:
+            tuple: (text, total_tokens)
+        """
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **kwargs
+        )
+        tokens = response.usage.total_tokens if response.usage else 0
+        return response.choices[0].message.content, tokens
+
+    def stream(self, messages, model, temperature, max_tokens=None):
+        """Open a streamed chat completion and return an iterator of text chunks."""
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            **kwargs
+        )
+        return (
+            chunk.choices[0].delta.content
+            for chunk in stream
+            if chunk.choices and chunk.choices[0].delta.content
+        )
+
+    def generate_image(self, prompt, model, size):
+        """Generate an image and return its URL."""
+        response = self.client.images.generate(model=model, prompt=prompt, n=1, size=size)
+        return response.data[0].url
+
+    def synthesize_speech(self, text, voice):
+        """Convert text to speech and return the MP3 bytes."""
+        response = self.client.audio.speech.create(model="tts-1", voice=voice, input=text)
+        return response.content
+
+class LatencyModel:
+    """Samples simulated latencies from a named distribution."""
+
+    def __init__(self, spec, rng):
+        """
+        Args:
+            spec (str): "fixed:S", "uniform:MIN:MAX", "normal:MEAN:STD" or
+                "lognormal:MEDIAN:SIGMA", in seconds
+            rng (random.Random): Source of randomness
+        """
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng
+
+    def sample(self):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.params))
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return self.rng.lognormvariate(0, sigma) * median
+        raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+class StubProvider:
+    """Offline provider returning deterministic outputs after simulated latency."""
+
+    name = "stub"
+
+    # Used for any endpoint missing from the latency spec
+    DEFAULT_LATENCY = {"chat": "fixed:0", "image": "fixed:0", "speech": "fixed:0"}
+
+    def __init__(self, latency_spec="", seed=0):
+        """
+        Args:
+            latency_spec (str): Comma-separated endpoint=distribution pairs
+            seed (int): Seed for the latency samples
+        """
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        specs = dict(self.DEFAULT_LATENCY)
+        for part in filter(None, (p.strip() for p in latency_spec.split(","))):
+            endpoint, spec = part.split("=", 1)
+            specs[endpoint.strip()] = spec.strip()
+        self.latency = {endpoint: LatencyModel(spec, self._rng) for endpoint, spec in specs.items()}
+
+    def _wait(self, endpoint):
+        with self._lock:
+            delay = self.latency[endpoint].sample()
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _digest(*parts):
+        return hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def _reply(self, messages, model, temperature):
+        digest = self._digest(model, temperature, *(m["content"] for m in messages))
+        if any("JSON" in m["content"] for m in messages):
+            return json.dumps({"action_type": "text", "target": None, "details": {"stub": digest[:12]}})
+        prompt = messages[-1]["content"]
+        return f"[stub {digest[:12]}] O narrador responde a: {prompt[-120:]}"
+
+    def complete(self, messages, model, temperature, max_tokens=None):
+        self._wait("chat")
+        text = self._reply(messages, model, temperature)
+        tokens = sum(len(m["content"].split()) for m in messages) + len(text.split())
+        return text, tokens
+
+    def stream(self, messages, model, temperature, max_tokens=None):
+        self._wait("chat")
+        text = self._reply(messages, model, temperature)
+        return (word + " " for word in text.split(" "))
+
+    def generate_image(self, prompt, model, size):
+        self._wait("image")
+        # A local, always-available asset; the query string keeps outputs distinct per prompt
+        return f"/static/placeholder.svg?stub={self._digest(model, size, prompt)[:16]}"
+
+    def synthesize_speech(self, text, voice):
+        self._wait("speech")
+        digest = bytes.fromhex(self._digest(voice, text))
+        return b"ID3" + digest * max(1, len(text) // 8)
+
+_provider = None
+_provider_lock = threading.Lock()
+
+def create_provider(name=None):
+    """
+    Build a provider by name
+
+    Args:
+        name (str, optional): "openai" or "stub"; defaults to AI_PROVIDER
+
+    Returns:
+        The provider instance
+    """
+    name = name or PROVIDER_CONFIG["provider"]
+    if name == "stub":
+        provider = StubProvider(PROVIDER_CONFIG["stub_latency"], PROVIDER_CONFIG["stub_seed"])
+    elif name == "openai":
+        provider = OpenAIProvider()
+    else:
+        raise ValueError(f"Unknown AI provider: {name}")
+
+    resilience_setting = PROVIDER_CONFIG["resilience"]
+    if (resilience_setting is None and name == "openai") or resilience_setting == "1":
+        provider = resilience.ResilientProvider(provider)
+    return provider
+
+def get_provider():
+    """Return the process-wide provider, creating it on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+                logger.info(f"Using AI provider: {_provider.name}")
+    return _provider
+
+def set_provider(provider):
+    """
+    Replace the process-wide provider
+
+    Args:
+        provider: Any object implementing complete, stream (returning an
+            iterator of chunks), generate_image and synthesize_speech
+    """
+    global _provider
+    _provider = provider
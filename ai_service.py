@@ -1,62 +1,126 @@
-import os
 import json 
 import logging
-import base64
-from dotenv import dotenv_values
-from openai import OpenAI
+import time
+
+import ai_pipeline
+import ai_providers
+import asset_store
+import metrics
+import response_cache
+import singleflight
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# The backend (OpenAI or the offline stub) is chosen by ai_providers from AI_PROVIDER
 
+# Coalesce identical in-flight requests (see singleflight)
+_text_flight = singleflight.SingleFlight("text")
+_image_flight = singleflight.SingleFlight("image")
 
-env_vars = dotenv_values('.env') 
-os.environ['OPENAI_API_KEY'] = env_vars['OPENAI_API_KEY'] 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") 
-
-
-
-
-client = OpenAI(api_key=OPENAI_API_KEY) 
+# Default system message for narration requests
+DEFAULT_SYSTEM_MESSAGE = "Você é um mestre de RPG. Forneça respostas sucintas, em português."
 
+# Narration returned when the text model cannot be reached
+TEXT_FALLBACK_MESSAGE = "A magia antiga que alimenta este reino parece estar temporariamente enfraquecida. (Erro ao comunicar com o serviço de IA)"
 
 
-def generate_text_response(prompt):
+def generate_text_response(prompt, system_message=DEFAULT_SYSTEM_MESSAGE, model="gpt-3.5-turbo", temperature=0.7, use_cache=True):
     """ 
-    Generate a text response using OpenAI's GPT model in Portuguese.
+    Generate a text response using the configured chat model in Portuguese.
     
     Args:
-        prompt (str): The prompt to send to the OpenAI API
+        prompt (str): The prompt to send to the AI provider
+        system_message (str): The system message for the model
+        model (str): The chat model to use
+        temperature (float): The sampling temperature
+        use_cache (bool): Whether to serve and store the response in the response cache
         
     Returns:
         str: The generated text response in Portuguese
     """
-    try: 
+    cache = response_cache.get_cache()
+    cache_key = response_cache.make_key(prompt, system_message, model, temperature)
+    if use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    def complete():
+        started = time.monotonic()
         # Using gpt-3.5-turbo which is more widely available
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo", 
-            messages=[
-                {"role": "system", "content": "Você é um mestre de RPG. Forneça respostas sucintas, em português."},
+        text, tokens = ai_providers.get_provider().complete(
+            [
+                {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=500,
-            temperature=0.7
+            model=model, 
+            temperature=temperature,
+            max_tokens=500
         )
-        return response.choices[0].message.content.strip()
+        text = text.strip()
+        metrics.record_tokens(model, tokens)
+        
+        if use_cache:
+            cache.set(cache_key, text, latency=time.monotonic() - started, tokens=tokens)
+        return text
+    
+    try: 
+        with metrics.span("llm"):
+            if use_cache:
+                # Identical prompts already in flight share one provider request
+                return _text_flight.do(
+                    cache_key, complete,
+                    timeout=ai_pipeline.PIPELINE_CONFIG["deadline_seconds"],
+                    fallback=TEXT_FALLBACK_MESSAGE
+                )
+            return complete()
     except Exception as e:
         logger.error(f"Error generating text: {e}") 
-        return "A magia antiga que alimenta este reino parece estar temporariamente enfraquecida. (Erro ao comunicar com o serviço de IA)"
+        return TEXT_FALLBACK_MESSAGE
+
+
+def generate_text_stream(prompt, system_message=DEFAULT_SYSTEM_MESSAGE, model="gpt-3.5-turbo", temperature=0.7):
+    """
+    Stream a text response from the configured chat model as it is generated.
+    
+    Args:
+        prompt (str): The prompt to send to the AI provider
+        system_message (str): The system message for the model
+        model (str): The chat model to use
+        temperature (float): The sampling temperature
+        
+    Yields:
+        str: Text chunks in arrival order
+    """
+    try:
+        yield from ai_providers.get_provider().stream(
+            [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            model=model,
+            temperature=temperature,
+            max_tokens=500
+        )
+    except Exception as e:
+        logger.error(f"Error streaming text: {e}")
+        yield TEXT_FALLBACK_MESSAGE
 
-def generate_image(prompt):
+def generate_image(prompt, wait_for_store=False):
     """ 
-    Generate an image using OpenAI's DALL-E model.
+    Generate an image using the configured image model (DALL-E by default).
     
     Args:
-        prompt (str): The prompt to send to the OpenAI API
+        prompt (str): The prompt to send to the AI provider
+        wait_for_store (bool): Wait for the local copy before returning, so the
+            next request for the prompt is served from the image store; if
+            the download fails the provider URL is returned, which expires
         
     Returns: 
-        str: The URL of the generated image
+        str: The URL of the generated image, or of its local copy when
+            the same filtered prompt was already stored
     """
     try:
         from filtering_toxicity import filter_image_prompt 
@@ -70,13 +134,32 @@ def generate_image(prompt):
             
         logger.info(f"Safe image prompt: {safe_prompt}")
         
-        response = client.images.generate(
-            model="dall-e-2", 
-            prompt=safe_prompt,
-            n=1,
-            size="512x512", 
+        # Identical filtered prompts reuse the stored image instead of generating again
+        image_store = asset_store.get_image_store()
+        stored_url = image_store.lookup_prompt(safe_prompt)
+        if stored_url:
+            return stored_url
+        
+        def generate():
+            image_url = ai_providers.get_provider().generate_image(
+                safe_prompt,
+                model="dall-e-2", 
+                size="512x512"
+            )
+            
+            # Provider URLs expire, so keep a local copy
+            if asset_store.is_remote_url(image_url):
+                download = image_store.schedule_download(image_url, safe_prompt)
+                if wait_for_store:
+                    return download.result() or image_url
+            return image_url
+        
+        # Players in the same scene at the same time share one generation
+        return _image_flight.do(
+            asset_store.sha256_hex(safe_prompt), generate,
+            timeout=ai_pipeline.PIPELINE_CONFIG["deadline_seconds"],
+            fallback=create_placeholder_image()
         )
-        return response.data[0].url
     except Exception as e:
         logger.error(f"Error generating image: {e}") 
         # Return a placeholder SVG image
@@ -89,26 +172,23 @@ def create_placeholder_image():
     
 def generate_audio(text, voice_type="onyx"):
     """
-    Generate an audio file using OpenAI's TTS API.
+    Generate an audio file using the configured TTS model.
     
     Args:
         text (str): The text to convert to speech
         voice_type (str): The voice type to use (alloy, echo, fable, onyx, nova, shimmer)
         
     Returns:
-        str: Base64 encoded audio data or None if an error occurs
+        str: Key of the MP3 file in the audio store or None if an error occurs
     """
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice_type,
-            input=text
-        )
+        audio_store = asset_store.get_audio_store()
+        audio_key = audio_store.key_for(text, voice_type)
+        if audio_store.exists(audio_key):
+            return audio_key
         
-        
-        audio_data = response.content
-        base64_audio = base64.b64encode(audio_data).decode('utf-8') 
-        return base64_audio
+        audio_data = ai_providers.get_provider().synthesize_speech(text, voice_type)
+        return audio_store.put(audio_key, audio_data)
     except Exception as e: 
         logger.error(f"Error generating audio: {e}")
         return None
@@ -123,7 +203,7 @@ def generate_character_introduction_audio(character_name, character_class, voice
         voice_type (str): The voice type to use
         
     Returns:
-        tuple: (intro_text, base64_audio) or (None, None) if an error occurs
+        str: Key of the stored MP3 file or None if an error occurs
     """
     try:
         
@@ -152,17 +232,18 @@ def parse_game_action(action_text):
     """
     try:
         
-        response = client.chat.completions.create(
-            model="o3-mini", 
-            messages=[
+        content, tokens = ai_providers.get_provider().complete(
+            [
                 {"role": "system", "content": "Você é uma IA que analisa comandos de jogadores em um jogo de RPG. Extraia o tipo de ação e detalhes relevantes da entrada do jogador. Responda com um objeto JSON."},
                 {"role": "user", "content": f"Analise esta ação do jogador em um formato estruturado: '{action_text}'. Responda com um objeto JSON válido tendo os campos action_type, target e details."}
             ],
+            model="o3-mini", 
             temperature=0.3
         )
+        metrics.record_tokens("o3-mini", tokens)
         
         try: 
-            return json.loads(response.choices[0].message.content) 
+            return json.loads(content) 
         except json.JSONDecodeError: 
             
             return { 
@@ -174,4 +255,16 @@ def parse_game_action(action_text):
         logger.error(f"Error parsing action: {e}")
         return {"action_type": "unknown", "target": None, "details": {}} 
 
-
+def get_ai_status():
+    """
+    Report the provider, its limiter/breaker state and the response cache counters.
+    
+    Returns:
+        dict: Status data for monitoring
+    """
+    provider = ai_providers.get_provider()
+    return {
+        "provider": provider.name,
+        "endpoints": provider.state() if hasattr(provider, "state") else {},
+        "response_cache": response_cache.get_cache().stats()
+    }
@@ -1,7 +1,12 @@
 import os
 import json
+import time
 import logging
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+import click
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file, abort
+from flask import Response, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from flask_sqlalchemy import SQLAlchemy
 from models import User, Character, GameState, GameImage, CharacterAudio
 import secrets
@@ -16,7 +21,8 @@ from dotenv import dotenv_values
 
 # Load environment variables
 env_vars = dotenv_values('.env')
-os.environ['SESSION_SECRET'] = env_vars['SESSION_SECRET']
+if env_vars.get('SESSION_SECRET'):
+    os.environ['SESSION_SECRET'] = env_vars['SESSION_SECRET']
 #print(f"Session Secret Key: {os.environ.get('SESSION_SECRET')}")
 
 # Configure logging
@@ -26,6 +32,10 @@ logging.basicConfig(level=logging.DEBUG)
 db = SQLAlchemy()
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
+if not app.secret_key:
+    # Offline runs (benchmarks, CI) have no .env; sessions then last one process
+    logging.warning("SESSION_SECRET not found. Using a random secret key instead.")
+    app.secret_key = secrets.token_hex(16)
 
 # Configure database - use PostgreSQL if available, otherwise fallback to SQLite
 database_url = os.environ.get("DATABASE_URL")
@@ -45,13 +55,23 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.init_app(app)
 
 # Import routes after app initialization to avoid circular imports
-from models import User, Character, GameState, GameImage, CharacterAudio
+from models import User, Character, GameState, GameImage, CharacterAudio, SceneImage
 from game_engine import GameEngine
 from ai_service import generate_text_response, generate_image, generate_character_introduction_audio
+from ai_service import generate_audio, generate_text_stream, create_placeholder_image, TEXT_FALLBACK_MESSAGE
+from ai_service import get_ai_status
+import ai_pipeline
+import asset_store
+import image_jobs
+import image_policy
+import metrics
+import scene_assets
 import inventory_system
 import game_world
 import game_objectives
 import filtering_toxicity
+import toxicity_model
+import migrations
 
 # Initialize the game engine
 engine = GameEngine()
@@ -61,9 +81,93 @@ engine = GameEngine()
 with app.app_context():
     # Create all database tables
     db.create_all()
+    # Add tables and columns introduced after the tables were created
+    migrations.upgrade_schema(db.engine)
     # Initialize game world data
     engine.initialize_game_world()
 
+if scene_assets.SCENE_CONFIG["warmup_on_start"]:
+    scene_assets.get_scene_assets().start_warmup()
+
+def _relink_stored_image(remote_url, local_url):
+    """Point GameImage rows at the local copy once a provider image is downloaded."""
+    with app.app_context():
+        db.session.query(GameImage).filter_by(image_url=remote_url).update({"image_url": local_url})
+        db.session.commit()
+
+asset_store.get_image_store().add_listener(_relink_stored_image)
+
+def _store_job_image(job):
+    """Give a scene's GameImage row its generated URL when the image job finishes."""
+    # A failed job leaves the row on the previous scene's image, not the placeholder
+    if not job["image_id"] or job["status"] != image_jobs.DONE:
+        return
+    with app.app_context():
+        db.session.query(GameImage).filter_by(id=job["image_id"]).update({"image_url": job["image_url"]})
+        db.session.commit()
+
+image_jobs.get_queue().add_listener(_store_job_image)
+image_jobs.get_queue().start()
+
+# Compile the moderation term lists before the first request
+filtering_toxicity.load_filter_terms()
+
+@app.before_request
+def _begin_request_metrics():
+    metrics.begin_request(request.endpoint or "unknown")
+
+@app.after_request
+def _end_request_metrics(response):
+    timer = metrics.end_request()
+    if timer is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(timer)
+    return response
+
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(db_session):
+    db_session.info["commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _record_commit_time(db_session):
+    started = db_session.info.pop("commit_started", None)
+    if started is not None:
+        metrics.record_span("db_commit", time.perf_counter() - started)
+
+def _collect_ai_metrics():
+    """Gauges for /metrics from the AI provider, response cache and image queue."""
+    status = get_ai_status()
+    breaker_states = {"closed": 0, "half_open": 1, "open": 2}
+    endpoints = status["endpoints"]
+    cache = status["response_cache"]
+    return [
+        ("rpg_ai_in_flight", "Provider calls in flight by endpoint", ("endpoint",),
+         [((name, ), state["in_flight"]) for name, state in endpoints.items()]),
+        ("rpg_ai_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("endpoint",),
+         [((name, ), breaker_states.get(state["state"], 0)) for name, state in endpoints.items()]),
+        ("rpg_ai_calls", "Provider calls by endpoint and outcome since start", ("endpoint", "outcome"),
+         [((name, outcome), state[outcome]) for name, state in endpoints.items()
+          for outcome in ("calls", "failures", "retries", "rejected")]),
+        ("rpg_response_cache", "Response cache counters since start", ("counter",),
+         [((counter, ), cache[counter]) for counter in ("memory_hits", "disk_hits", "misses", "saved_seconds", "saved_tokens")
+          if counter in cache]),
+        ("rpg_image_jobs_pending", "Image jobs waiting or running", (),
+         [((), image_jobs.get_queue().pending_count())])
+    ]
+
+metrics.REGISTRY.add_collector(_collect_ai_metrics)
+
+def _refresh_image_urls(images):
+    """Relink images whose download finished before their row was committed."""
+    image_store = asset_store.get_image_store()
+    changed = False
+    for image in images:
+        local_url = image_store.resolve(image.image_url)
+        if local_url != image.image_url:
+            image.image_url = local_url
+            changed = True
+    if changed:
+        db.session.commit()
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -119,10 +223,16 @@ def create_character():
     game_state = GameState(
         character_id=character.id,
         current_location=game_world.WORLD_CONFIG["starting_location"],
-        inventory=json.dumps(starting_inventory),
+        inventory="",
         quest_progress=json.dumps({"completed_quests": []})
     )
     db.session.add(game_state)
+    db.session.flush()
+    
+    # The inventory rows reference the new game state
+    inventory = inventory_system.InventoryAccessor(game_state, character.id)
+    inventory.replace(starting_inventory)
+    inventory.flush()
     db.session.commit()
     
     session["character_id"] = character.id
@@ -135,7 +245,27 @@ def create_character():
     # Generate first scene with Portuguese description
     initial_prompt = f"Uma nova aventura começa para {name}, um {class_data.get('name', character_class)} de nível 1. Eles se encontram em {location_data['name']}, {location_data['description']}"
     
-    image_url = generate_image(initial_prompt)
+    # Create initial scene description using Portuguese prompt
+    description_prompt = f"Você é o mestre de um RPG de fantasia. Crie uma introdução detalhada para um novo personagem chamado {name}, um {class_data.get('name', character_class)}. Descreva a vila inicial ({location_data['name']}) e mencione 3 possíveis locais que eles podem visitar ou pessoas com quem podem falar. Mantenha a resposta com menos de 300 palavras. Responda APENAS em português."
+    
+    # Gerar texto de introdução do personagem
+    intro_prompt = f"Crie uma introdução curta e dramática com cerca de 3 frases para {name}, um(a) {class_data.get('name', character_class)} em uma aventura de RPG. Fale na primeira pessoa, como se fosse o próprio personagem se apresentando. Mencione algo sobre a classe e a jornada que está por vir. Use linguagem épica e inspiradora. Mantenha a resposta com menos de 100 palavras."
+    
+    def generate_intro_audio():
+        # The audio depends on the intro text, so both run in the same task
+        intro_text = generate_text_response(intro_prompt)
+        logging.info(f"Generating audio introduction for character {name}")
+        return intro_text, generate_audio(intro_text, voice_type="onyx")
+    
+    # Independent provider calls run in parallel; creation waits only for the slowest one
+    generated = ai_pipeline.run_parallel({
+        "image_url": (lambda: generate_image(initial_prompt), create_placeholder_image()),
+        "description": (lambda: generate_text_response(description_prompt), TEXT_FALLBACK_MESSAGE),
+        "intro_audio": (generate_intro_audio, (None, None))
+    })
+    image_url = generated["image_url"]
+    initial_description = generated["description"]
+    intro_text, audio_key = generated["intro_audio"]
     
     # Save image to database
     new_image = GameImage(
@@ -146,38 +276,21 @@ def create_character():
     db.session.add(new_image)
     db.session.commit()
     
-    # Create initial scene description using Portuguese prompt
-    initial_description = generate_text_response(
-        f"Você é o mestre de um RPG de fantasia. Crie uma introdução detalhada para um novo personagem chamado {name}, um {class_data.get('name', character_class)}. Descreva a vila inicial ({location_data['name']}) e mencione 3 possíveis locais que eles podem visitar ou pessoas com quem podem falar. Mantenha a resposta com menos de 300 palavras. Responda APENAS em português."
-    )
-    
     # Generate initial hint for new players
     initial_hint = generate_contextual_hint(character, game_state, "novo jogo", {})
     
-    # Gerar introdução de áudio para o personagem
+    # Salvar a introdução de áudio do personagem
     has_audio_intro = False
     audio_id = None
     
     try:
-        from ai_service import generate_audio
-        import logging
-        
-        # Gerar texto de introdução do personagem
-        intro_text = generate_text_response(
-            f"Crie uma introdução curta e dramática com cerca de 3 frases para {name}, um(a) {class_data.get('name', character_class)} em uma aventura de RPG. Fale na primeira pessoa, como se fosse o próprio personagem se apresentando. Mencione algo sobre a classe e a jornada que está por vir. Use linguagem épica e inspiradora. Mantenha a resposta com menos de 100 palavras."
-        )
-        
-        # Gerar áudio para o texto de introdução
-        logging.info(f"Generating audio introduction for character {name}")
-        audio_data = generate_audio(intro_text, voice_type="onyx")
-        
-        if audio_data:
+        if audio_key:
             # Salvar áudio no banco de dados
             character_audio = CharacterAudio(
                 character_id=character.id,
                 audio_type="introduction",
                 audio_text=intro_text,
-                audio_data=audio_data,
+                audio_key=audio_key,
                 voice_type="onyx"
             )
             db.session.add(character_audio)
@@ -190,7 +303,6 @@ def create_character():
             logging.warning("Failed to generate audio data")
     except Exception as e:
         import traceback
-        import logging
         logging.error(f"Error generating character audio: {e}")
         logging.error(traceback.format_exc())
     
@@ -233,6 +345,7 @@ def game():
     
     # Get game history (last 5 images)
     history = db.session.query(GameImage).filter_by(character_id=character_id).order_by(GameImage.created_at.desc()).limit(5).all()
+    _refresh_image_urls([image] + history)
     # Check if character has an audio introduction
     has_audio_intro = False
     intro_audio_id = None    
@@ -263,44 +376,246 @@ def process_command():
         return jsonify({"error": "Nenhum personagem ativo"}), 400
     
     command = request.form.get("command")
+    turn = _prepare_command_turn(command)
+    character = turn["character"]
+    game_state = turn["game_state"]
+    
+    # Generate text response from AI (in Portuguese)
+    response_text = turn["response_text"]
+    if turn["narration_prompt"]:
+        # Moderated with the same rules as the streamed narration
+        _, response_text = filtering_toxicity.check_ai_response(
+            generate_text_response(turn["narration_prompt"], use_cache=False)
+        )
+    
+    # New images are generated in the background; until then the scene keeps the previous image
+    with metrics.span("image"):
+        new_image, image_job_id = _scene_image_for_turn(turn)
+    image_url = new_image.image_url
+    
+    # Generate contextual hint based on the game state and current action
+    with metrics.span("hint"):
+        hint = generate_contextual_hint(character, game_state, command, turn["result"], turn["inventory"])
+    
+    # Update session with new scene
+    session["current_scene"] = {
+        "description": response_text,
+        "image_id": new_image.id,
+        "has_audio_intro": False,  # Desativamos temporariamente o recurso de áudio
+        "hint": hint
+    }
+    
+    # Warm the next likely scenes while the player reads this one
+    engine.prefetch_adjacent_scenes(**turn["prefetch"])
+    
+    return jsonify({
+        "description": response_text,
+        "image_url": image_url,
+        "image_job_id": image_job_id,
+        "current_location": game_state.current_location,
+        "hint": hint
+    })
+
+@app.route("/command/stream", methods=["POST"])
+def stream_command():
+    """Process a command and stream the narration as Server-Sent Events."""
+    if "character_id" not in session:
+        return jsonify({"error": "Nenhum personagem ativo"}), 400
+    
+    command = request.form.get("command")
+    turn = _prepare_command_turn(command, defer_narration=True)
+    character = turn["character"]
+    game_state = turn["game_state"]
+    
+    # New images are generated in the background while the narration streams
+    with metrics.span("image"):
+        new_image, image_job_id = _scene_image_for_turn(turn)
+    
+    with metrics.span("hint"):
+        hint = generate_contextual_hint(character, game_state, command, turn["result"], turn["inventory"])
+    
+    # The session cookie is sent with the headers, before the narration exists.
+    # Narrated scenes fall back to the generic description when the page reloads.
+    session["current_scene"] = {
+        "description": turn["response_text"] or "Você continua sua aventura...",
+        "image_id": new_image.id,
+        "has_audio_intro": False,
+        "hint": hint
+    }
+    
+    engine.prefetch_adjacent_scenes(**turn["prefetch"])
+    
+    # The request is timed until the last event; the Server-Timing header,
+    # sent first, only has the stages before the stream
+    timer = metrics.detach_request()
+    
+    def events():
+        try:
+            yield from stream_events()
+        finally:
+            metrics.end_request(timer)
+    
+    def stream_events():
+        if turn["narration_prompt"]:
+            # Moderated as it streams; only a possible partial term is held back
+            moderation = filtering_toxicity.ResponseStreamFilter()
+            llm_started = time.perf_counter()
+            for chunk in generate_text_stream(turn["narration_prompt"]):
+                text = moderation.feed(chunk)
+                if moderation.blocked:
+                    break
+                if text:
+                    yield _sse_event("narration", {"text": text})
+            if timer is not None:
+                timer.add("llm", time.perf_counter() - llm_started)
+            
+            text = moderation.finish()
+            if moderation.blocked:
+                # The client swaps what was already shown for the safe message
+                yield _sse_event("replace", {"text": filtering_toxicity.BLOCKED_RESPONSE})
+            elif text:
+                yield _sse_event("narration", {"text": text})
+        else:
+            yield _sse_event("narration", {"text": turn["response_text"]})
+        
+        yield _sse_event("hint", {"hint": hint})
+        
+        if image_job_id is None:
+            job = {"status": image_jobs.DONE, "image_url": new_image.image_url}
+        else:
+            job = image_jobs.get_queue().wait(image_job_id, ai_pipeline.PIPELINE_CONFIG["deadline_seconds"])
+        if job and job["status"] in (image_jobs.DONE, image_jobs.FAILED):
+            image_url = asset_store.get_image_store().resolve(job["image_url"])
+            yield _sse_event("image", {"image_url": image_url})
+        else:
+            # Still generating; the client polls /image_job for it
+            yield _sse_event("image_job", {"job_id": image_job_id})
+        
+        yield _sse_event("done", {"current_location": game_state.current_location})
+    
+    response = Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    if timer is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(timer)
+    return response
+
+def _scene_image_for_turn(turn):
+    """
+    Pick the scene image of a turn according to the engine's image policy
+    
+    Args:
+        turn (dict): The result of _prepare_command_turn
+        
+    Commits the session, saving the turn's game state changes with the image.
+    
+    Returns:
+        tuple: (GameImage, job id); the job id is None when nothing is generated.
+            A new row shows the previous scene image until its job finishes.
+    """
+    character = turn["character"]
+    result = turn["result"]
+    policy = image_policy.get_policy(result)
+    previous_image = db.session.query(GameImage).filter_by(character_id=character.id).order_by(GameImage.created_at.desc()).first()
+    
+    if policy == image_policy.REUSE_IMAGE and previous_image:
+        # Nothing to add, but the turn's game state changes still need saving
+        db.session.commit()
+        return previous_image, None
+    
+    if policy == image_policy.STATIC_IMAGE:
+        static_url = image_policy.get_static_url(result)
+        if previous_image and previous_image.image_url == static_url:
+            db.session.commit()
+            return previous_image, None
+        static_image = GameImage(
+            character_id=character.id,
+            prompt=turn["image_prompt"],
+            image_url=static_url
+        )
+        db.session.add(static_image)
+        db.session.commit()
+        return static_image, None
+    
+    # Places already seen at this time of day keep their image
+    scene = image_policy.get_scene(result)
+    scene_record = None
+    if scene:
+        location, time_of_day = scene
+        scene_record = db.session.query(SceneImage).filter_by(
+            character_id=character.id, location=location, time_of_day=time_of_day
+        ).first()
+        if scene_record:
+            scene_image = db.session.query(GameImage).get(scene_record.image_id)
+            if scene_image:
+                db.session.commit()
+                return scene_image, None
+    
+    new_image = GameImage(
+        character_id=character.id,
+        prompt=turn["image_prompt"],
+        image_url=previous_image.image_url if previous_image else create_placeholder_image()
+    )
+    db.session.add(new_image)
+    db.session.flush()
+    
+    if scene_record:
+        scene_record.image_id = new_image.id
+    elif scene:
+        db.session.add(SceneImage(
+            character_id=character.id,
+            location=location,
+            time_of_day=time_of_day,
+            image_id=new_image.id
+        ))
+    db.session.commit()
+    
+    job_id = image_jobs.get_queue().enqueue(turn["image_prompt"], new_image.id)
+    return new_image, job_id
+
+def _sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _prepare_command_turn(command, defer_narration=False):
+    """
+    Run the engine for a command and build the prompts the turn still needs
+    
+    Args:
+        command (str): The player's command
+        defer_narration (bool): Return the LLM narration prompt instead of calling the model
+        
+    Returns:
+        dict: character, game_state, inventory (the request's InventoryAccessor),
+            result, response_text, narration_prompt (None when no LLM narration
+            is needed), image_prompt and prefetch (the arguments of
+            engine.prefetch_adjacent_scenes, read before the commit)
+    """
     character_id = session["character_id"]
     character = db.session.query(Character).get(character_id)
     game_state = db.session.query(GameState).filter_by(character_id=character_id).first()
     
-    # Verificar e garantir que o inventário do personagem seja válido
-    try:
-        if not game_state.inventory:
-            logging.warning(f"Inventário vazio para personagem {character.id}, inicializando novo")
-            new_inventory = inventory_system.initialize_inventory(character.id)
-            game_state.inventory = json.dumps(new_inventory)
-            db.session.commit()
-        else:
-            # Teste se o inventário é um JSON válido
-            try:
-                inventory_data = json.loads(game_state.inventory)
-                if not isinstance(inventory_data, dict):
-                    raise ValueError("Formato de inventário inválido")
-            except (json.JSONDecodeError, ValueError) as e:
-                logging.error(f"Inventário inválido para personagem {character.id}: {e}")
-                new_inventory = inventory_system.initialize_inventory(character.id)
-                game_state.inventory = json.dumps(new_inventory)
-                db.session.commit()
-    except Exception as e:
-        logging.error(f"Erro ao processar inventário: {e}")
-        # Não deixe o erro interromper o processamento do comando
+    # Parsed (and repaired if invalid) at most once for the whole request
+    inventory = inventory_system.InventoryAccessor(game_state, character.id)
     
     # Process command through game engine
     try:
-        result = engine.process_command(command, character, game_state)
+        with metrics.span("engine"):
+            result = engine.process_command(command, character, game_state, defer_narration=defer_narration,
+                                            inventory=inventory)
     except Exception as e:
         logging.error(f"Erro no processamento do comando '{command}': {e}")
         result = {
             "context": "Houve um erro ao processar seu comando. (Algo deu errado no mundo do jogo)",
             "new_location": None,
-            "image_prompt": f"{character.name} olhando confuso enquanto explora o mundo"
+            "image_prompt": f"{character.name} olhando confuso enquanto explora o mundo",
+            "image_policy": image_policy.REUSE_IMAGE,
+            "command_type": "error"
         }
+    metrics.set_command_type(result.get("command_type", "unknown"))
     
-    # Generate text response from AI (in Portuguese)
     class_data = game_world.CHARACTER_CLASSES.get(character.character_class, {})
     class_name = class_data.get('name', character.character_class)
     
@@ -312,13 +627,13 @@ def process_command():
     
     # Use the context from game engine, which is already in Portuguese
     response_text = result.get('context', '')
+    narration_prompt = result.get('narration_prompt')
     
     # If we need to generate AI response for complex commands
-    if not response_text or "ai_response" in result:
-        safe_prompt = filtering_toxicity.add_safety_prompt_prefix(
+    if not narration_prompt and (not response_text or "ai_response" in result):
+        narration_prompt = filtering_toxicity.add_safety_prompt_prefix(
             f"Você é o mestre de um RPG de fantasia. Responda ao comando do jogador: '{command}'. {context} Mantenha a resposta com cerca de 200 palavras. Responda APENAS em português."
         )
-        response_text = generate_text_response(safe_prompt)
     
     # Generate image for the new scene with character descriptions for consistency
     character_description = ""
@@ -338,40 +653,24 @@ def process_command():
             character_description = f"{character.name}, um {class_name}"
             
     image_prompt = result.get('image_prompt', f"{character_description}, {command}. Cena de RPG, cenário de fantasia medieval, estilo detalhado.")
-    image_url = generate_image(image_prompt)
-    
-    # Save image to database
-    new_image = GameImage(
-        character_id=character.id,
-        prompt=image_prompt,
-        image_url=image_url
-    )
-    db.session.add(new_image)
     
     # Update game state if needed
     if result.get("new_location"):
         game_state.current_location = result["new_location"]
     
-    # Save changes
-    db.session.commit()
-    
-    # Generate contextual hint based on the game state and current action
-    hint = generate_contextual_hint(character, game_state, command, result)
-    
-    # Update session with new scene
-    session["current_scene"] = {
-        "description": response_text,
-        "image_id": new_image.id,
-        "has_audio_intro": False,  # Desativamos temporariamente o recurso de áudio
-        "hint": hint
+    # Write the changed items once; the commit in _scene_image_for_turn saves them
+    inventory.flush()
+    
+    return {
+        "character": character,
+        "game_state": game_state,
+        "inventory": inventory,
+        "result": result,
+        "response_text": response_text,
+        "narration_prompt": narration_prompt,
+        "image_prompt": image_prompt,
+        "prefetch": engine.prefetch_target(character, game_state)
     }
-    
-    return jsonify({
-        "description": response_text,
-        "image_url": image_url,
-        "current_location": game_state.current_location,
-        "hint": hint
-    })
 
 @app.route("/save_game", methods=["POST"])
 def save_game():
@@ -445,26 +744,148 @@ def load_character(character_id):
     flash("Você não tem permissão para carregar este personagem", "error")
     return redirect(url_for("index"))
 
+# Estado do provedor de IA (limites, disjuntor e cache de respostas)
+@app.route("/ai_status", methods=["GET"])
+def ai_status():
+    return jsonify(get_ai_status())
+
+# Estado de um job de imagem de cena (o cliente consulta até a imagem ficar pronta)
+@app.route("/image_job/<int:job_id>", methods=["GET"])
+def get_image_job(job_id):
+    """Report the state of a scene image job."""
+    if "character_id" not in session:
+        return jsonify({"error": "Nenhum personagem ativo"}), 400
+    
+    job = image_jobs.get_queue().get(job_id)
+    image = db.session.query(GameImage).get(job["image_id"]) if job and job["image_id"] else None
+    if not image or image.character_id != session["character_id"]:
+        return jsonify({"error": "Imagem não encontrada"}), 404
+    
+    finished = job["status"] in (image_jobs.DONE, image_jobs.FAILED)
+    return jsonify({
+        "status": job["status"],
+        "image_url": asset_store.get_image_store().resolve(job["image_url"]) if finished else None
+    })
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Latency histograms, command counters and AI gauges in the Prometheus text format."""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/ready", methods=["GET"])
+def readiness():
+    """Readiness probe: 200 once the scene warm-up pass is done (or disabled), 503 with progress before."""
+    status = scene_assets.get_scene_assets().readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+# Endpoint para servir as imagens geradas armazenadas localmente
+@app.route("/assets/images/<content_hash>.png", methods=["GET"])
+def serve_image_asset(content_hash):
+    if not asset_store.is_valid_key(content_hash):
+        abort(404)
+    
+    path = asset_store.get_image_store().blobs.path_for(content_hash)
+    if not os.path.exists(path):
+        abort(404)
+    
+    # Content-addressed files never change, so clients may cache them forever
+    response = send_file(path, mimetype="image/png", etag=content_hash, max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # Endpoint para recuperar o áudio de introdução de um personagem
 @app.route("/character_audio/<int:audio_id>", methods=["GET"])
 def get_character_audio(audio_id):
+    audio = _get_owned_audio(audio_id)
+    if audio is None:
+        return jsonify({"error": "Áudio não encontrado"}), 404
+    if audio is False:
+        return jsonify({"error": "Acesso não autorizado"}), 403
+
+    # Only metadata here; the MP3 itself is streamed by stream_character_audio
+    return jsonify({
+        "audio_url": url_for("stream_character_audio", audio_id=audio.id),
+        "audio_text": audio.audio_text,
+        "voice_type": audio.voice_type
+    })
+
+# Endpoint para transmitir o arquivo MP3 (com suporte a requisições Range)
+@app.route("/character_audio/<int:audio_id>/stream", methods=["GET"])
+def stream_character_audio(audio_id):
+    audio = _get_owned_audio(audio_id)
+    if audio is None:
+        return jsonify({"error": "Áudio não encontrado"}), 404
+    if audio is False:
+        return jsonify({"error": "Acesso não autorizado"}), 403
+
+    path = asset_store.get_audio_store().path_for(audio.audio_key)
+    if not os.path.exists(path):
+        return jsonify({"error": "Áudio não encontrado"}), 404
+
+    return send_file(path, mimetype="audio/mpeg", etag=audio.audio_key, max_age=86400, conditional=True)
+
+def _get_owned_audio(audio_id):
+    """
+    Load a CharacterAudio row owned by the current user
+
+    Returns:
+        CharacterAudio: The row, None if it does not exist or False if the user does not own it
+    """
     audio = db.session.query(CharacterAudio).get(audio_id)
-    
     if not audio:
-        return jsonify({"error": "Áudio não encontrado"}), 404
+        return None
 
     # Verificar se o personagem pertence ao usuário atual
-    if "user_id" in session and db.session.query(Character).get(audio.character_id).user_id == session["user_id"]:
-        return jsonify({
-            "audio_data": audio.audio_data,
-            "audio_text": audio.audio_text,
-            "voice_type": audio.voice_type
-        })
-    
-    return jsonify({"error": "Acesso não autorizado"}), 403
+    if "user_id" not in session or db.session.query(Character).get(audio.character_id).user_id != session["user_id"]:
+        return False
+
+    # Rows created before the audio store are moved to disk on first access
+    if migrations.migrate_audio_row(audio):
+        db.session.commit()
+
+    return audio
+
+@app.cli.command("migrate-audio")
+def migrate_audio_command():
+    """Move base64 CharacterAudio payloads into the on-disk audio store."""
+    migrated = migrations.migrate_audio_to_store(db.session)
+    print(f"{migrated} áudios migrados")
+
+@app.cli.command("migrate-inventory")
+def migrate_inventory_command():
+    """Move JSON GameState inventories into the InventoryItem and EquippedSlot tables."""
+    migrated = migrations.migrate_inventory_to_tables(db.session)
+    print(f"{migrated} inventários migrados")
+
+@app.cli.command("train-toxicity")
+@click.argument("corpus", type=click.Path(exists=True, dir_okay=False))
+@click.option("--epochs", default=5, show_default=True, help="Passes over the corpus.")
+def train_toxicity_command(corpus, epochs):
+    """Train the toxicity classifier from a labelled corpus (one "label<TAB>text" per line)."""
+    examples = []
+    with open(corpus, encoding="utf-8") as f:
+        for line in f:
+            label, _, text = line.rstrip("\n").partition("\t")
+            if text and label in ("0", "1"):
+                examples.append((text, int(label)))
+    
+    classifier = toxicity_model.train(examples, epochs=epochs)
+    classifier.save(toxicity_model.TOXICITY_CONFIG["model_path"])
+    print(f"{len(examples)} exemplos; modelo salvo em {toxicity_model.TOXICITY_CONFIG['model_path']}")
+
+@app.cli.command("warm-scenes")
+def warm_scenes_command():
+    """Pre-render the description and image of every location at each time of day."""
+    def report(done, total, location, time_of_day):
+        print(f"[{done}/{total}] {location} ({time_of_day})")
+    
+    rendered = scene_assets.get_scene_assets().warm(progress=report)
+    status = scene_assets.get_scene_assets().readiness()
+    print(f"{rendered} cenas geradas; {status['rendered']}/{status['total']} prontas")
 
 # Função para gerar dicas contextuais baseadas no personagem, estado do jogo e comando atual
-def generate_contextual_hint(character, game_state, command, result):
+def generate_contextual_hint(character, game_state, command, result, inventory=None):
     """
     Gera uma dica contextual baseada no estado atual do jogo e na ação do jogador.
     
@@ -473,6 +894,7 @@ def generate_contextual_hint(character, game_state, command, result):
         game_state: O objeto GameState atual
         command: O comando que o jogador executou
         result: O resultado do processamento do comando
+        inventory: O InventoryAccessor da requisição, se já existir
         
     Returns:
         str: Uma dica contextual personalizada
@@ -484,24 +906,9 @@ def generate_contextual_hint(character, game_state, command, result):
     character_class = character.character_class
     character_health = character.health
     
-    # Verificar o inventário (em formato JSON)
-    import json
-    inventory = {}
-    try:
-        if game_state.inventory:
-            inventory = json.loads(game_state.inventory)
-        else:
-            # Se não houver inventário, inicialize um novo
-            logging.warning(f"Inventário vazio para personagem {character.id}")
-            inventory = inventory_system.initialize_inventory(character.id)
-            game_state.inventory = json.dumps(inventory)
-            db.session.commit()
-    except Exception as e:
-        logging.error(f"Erro ao carregar inventário: {e}")
-        # Criar um novo inventário se ocorrer um erro
-        inventory = inventory_system.initialize_inventory(character.id)
-        game_state.inventory = json.dumps(inventory)
-        db.session.commit()
+    # O inventário só é lido quando a dica depende dele
+    if inventory is None:
+        inventory = inventory_system.InventoryAccessor(game_state, character.id)
         
     # Conjunto de dicas gerais
     general_hints = [
@@ -566,7 +973,7 @@ def generate_contextual_hint(character, game_state, command, result):
     elif 'mapa' in command_lower:
         command_hint = "Use 'ir para [local]' para viajar entre áreas conhecidas. Novos locais são descobertos pela exploração."
     elif 'inventário' in command_lower:
-        if len(inventory) < 2:
+        if len(inventory.data) < 2:
             command_hint = "Seu inventário está quase vazio. Explore o mundo para encontrar ou comprar itens úteis."
     
     # Selecionar uma dica baseada na situação atual
@@ -0,0 +1,242 @@
+"""
+Asset Store Module for the Fantasy RPG
+
+This module keeps generated media on local disk. Files live in a blob store
+sharded by the first bytes of their SHA-256 key, so identical content is
+written once and can be served with long-lived cache headers. The image
+store downloads provider URLs in the background (they expire) and remembers
+which filtered prompt produced which file, so repeated scenes are served
+without a second generation. The audio store keeps raw TTS output keyed by
+the spoken text and voice.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Root directory for generated media
+ASSET_STORE_DIR = os.environ.get(
+    "ASSET_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "assets")
+)
+
+# Public URL prefix served by app.serve_image_asset
+IMAGE_URL_PREFIX = "/assets/images/"
+
+IMAGE_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompt_images (
+    prompt_hash TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS remote_images (
+    remote_url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+"""
+
+def sha256_hex(data):
+    """Return the SHA-256 hex digest of bytes or text."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def is_remote_url(url):
+    """Check whether an image URL points at the provider rather than a local asset."""
+    return bool(url) and url.startswith(("http://", "https://"))
+
+def is_valid_key(key):
+    """Check that a key is a SHA-256 hex digest (and safe to use in a path)."""
+    return len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+class BlobStore:
+    """Files addressed by a SHA-256 key, sharded into two directory levels."""
+
+    def __init__(self, root, extension):
+        self.root = root
+        self.extension = extension
+
+    def path_for(self, key):
+        """Return the file path for a key."""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.{self.extension}")
+
+    def exists(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def put(self, data, key=None):
+        """
+        Store bytes under a key
+
+        Args:
+            data (bytes): The file contents
+            key (str, optional): The key to use; defaults to the content hash
+
+        Returns:
+            str: The key the data was stored under
+        """
+        key = key or sha256_hex(data)
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return key
+
+class ImageStore:
+    """Local copies of generated images, indexed by filtered prompt and provider URL."""
+
+    def __init__(self, root=None, database=None, download_workers=2):
+        self.blobs = BlobStore(os.path.join(root or ASSET_STORE_DIR, "images"), "png")
+        self.database = database or LocalDatabase("asset_index.db", IMAGE_INDEX_SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="image-download")
+        self._listeners = []
+
+    def local_url(self, content_hash):
+        """Return the public URL of a stored image."""
+        return f"{IMAGE_URL_PREFIX}{content_hash}.png"
+
+    def lookup_prompt(self, prompt):
+        """
+        Find the stored image generated for a filtered prompt
+
+        Args:
+            prompt (str): The filtered image prompt
+
+        Returns:
+            str: The local URL, or None if the prompt has no stored image
+        """
+        row = self.database.execute(
+            "SELECT content_hash FROM prompt_images WHERE prompt_hash = ?",
+            (sha256_hex(prompt),)
+        ).fetchone()
+        if row and self.blobs.exists(row[0]):
+            return self.local_url(row[0])
+        return None
+
+    def resolve(self, url):
+        """
+        Map a provider URL to its local copy once it has been downloaded
+
+        Args:
+            url (str): An image URL as stored in GameImage
+
+        Returns:
+            str: The local URL if available, otherwise the URL unchanged
+        """
+        if not is_remote_url(url):
+            return url
+        row = self.database.execute(
+            "SELECT content_hash FROM remote_images WHERE remote_url = ?", (url,)
+        ).fetchone()
+        return self.local_url(row[0]) if row else url
+
+    def add_listener(self, listener):
+        """
+        Register a callback run after each download
+
+        Args:
+            listener: Callable taking (remote_url, local_url)
+        """
+        self._listeners.append(listener)
+
+    def schedule_download(self, remote_url, prompt):
+        """
+        Download a provider image in the background
+
+        Args:
+            remote_url (str): The provider URL
+            prompt (str): The filtered prompt that produced the image
+
+        Returns:
+            Future: Resolves to the local URL, or None if the download failed
+        """
+        return self._executor.submit(self._download, remote_url, prompt)
+
+    def _download(self, remote_url, prompt):
+        try:
+            with urllib.request.urlopen(remote_url, timeout=30) as response:
+                data = response.read()
+        except Exception as e:
+            logger.error(f"Error downloading generated image: {e}")
+            return None
+
+        content_hash = self.blobs.put(data)
+        with self.database.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prompt_images (prompt_hash, content_hash, created_at) VALUES (?, ?, ?)",
+                (sha256_hex(prompt), content_hash, time.time())
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO remote_images (remote_url, content_hash) VALUES (?, ?)",
+                (remote_url, content_hash)
+            )
+
+        local_url = self.local_url(content_hash)
+        logger.info(f"Stored generated image as {local_url}")
+        for listener in self._listeners:
+            try:
+                listener(remote_url, local_url)
+            except Exception as e:
+                logger.error(f"Error in image store listener: {e}")
+        return local_url
+
+class AudioStore:
+    """Synthesized speech kept as raw MP3 files, keyed by the (text, voice) pair."""
+
+    def __init__(self, root=None):
+        self.blobs = BlobStore(os.path.join(root or ASSET_STORE_DIR, "audio"), "mp3")
+
+    def key_for(self, text, voice_type):
+        """
+        Build the key for a speech request
+
+        Args:
+            text (str): The text converted to speech
+            voice_type (str): The TTS voice
+
+        Returns:
+            str: A SHA-256 hex digest identifying the audio
+        """
+        return sha256_hex(f"{voice_type}\0{text}")
+
+    def exists(self, key):
+        return self.blobs.exists(key)
+
+    def put(self, key, data):
+        """Store raw MP3 bytes under a key and return the key."""
+        return self.blobs.put(data, key=key)
+
+    def path_for(self, key):
+        return self.blobs.path_for(key)
+
+_image_store = None
+_audio_store = None
+
+def get_image_store():
+    """Return the process-wide image store, creating it on first use."""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    return _image_store
+
+def get_audio_store():
+    """Return the process-wide audio store, creating it on first use."""
+    global _audio_store
+    if _audio_store is None:
+        _audio_store = AudioStore()
+    return _audio_store
@@ -0,0 +1,123 @@
+"""
+Benchmark Script for the Fantasy RPG
+
+Drives the full Flask request path (character creation and commands) with
+the offline stub provider and reports throughput and latency percentiles.
+No outside services are needed.
+
+With --handlers, times the command router and each GameEngine handler on
+its own instead, without Flask or the database.
+
+Usage:
+    AI_STUB_LATENCY="chat=lognormal:0.8:0.4,image=uniform:2:6" python benchmark.py --commands 200 --threads 8
+    python benchmark.py --handlers --commands 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+COMMANDS = [
+    "olhar ao redor",
+    "status",
+    "inventário",
+    "ajuda",
+    "missões",
+    "falar com elias",
+    "equipar espada simples",
+    "explorar o ambiente"
+]
+
+def percentile(samples, fraction):
+    """Return the value at a fraction (0-1) of the sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def bench_handlers(iterations):
+    """Time the router and each command handler in isolation."""
+    import logging
+    import inventory_system
+    from game_engine import GameEngine, CommandContext
+    from models import Character, GameState
+    logging.disable(logging.WARNING)
+
+    engine = GameEngine()
+    engine.initialize_game_world()
+    character = Character(id=1, name="Bench", character_class="warrior", level=1, experience=0,
+                          health=100, mana=100, strength=5, intelligence=5, dexterity=5)
+    game_state = GameState(character_id=1, current_location="Meadowbrook",
+                           inventory=inventory_system.pack_inventory(inventory_system.initialize_inventory(1)),
+                           quest_progress=json.dumps({"completed_quests": []}))
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        engine.router.resolve(COMMANDS[i % len(COMMANDS)])
+    print(f"{'router':<12} {(time.perf_counter() - started) / iterations * 1e6:8.2f} us")
+
+    for command in COMMANDS:
+        handler_name, argument = engine.router.resolve(command)
+        handler_name = handler_name or "action"
+        handler = engine.handlers[handler_name]
+        started = time.perf_counter()
+        for _ in range(iterations):
+            game_state.current_location = "Meadowbrook"
+            handler(CommandContext(command, argument, character, game_state,
+                                   "Meadowbrook", engine.world_data["Meadowbrook"]))
+        print(f"{handler_name:<12} {(time.perf_counter() - started) / iterations * 1e6:8.2f} us  ({command})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the request path with the stub AI provider")
+    parser.add_argument("--commands", type=int, default=100, help="Commands to send per player")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent players")
+    parser.add_argument("--handlers", action="store_true", help="Benchmark the engine handlers in isolation")
+    args = parser.parse_args()
+
+    # Isolated, throwaway state for the run
+    workdir = tempfile.mkdtemp(prefix="rpg-bench-")
+    os.environ["AI_PROVIDER"] = "stub"
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("LOCAL_STORE_DIR", os.path.join(workdir, "local"))
+    os.environ.setdefault("ASSET_STORE_DIR", os.path.join(workdir, "assets"))
+
+    if args.handlers:
+        bench_handlers(args.commands)
+        return
+
+    import logging
+    from app import app, db
+    from models import Base
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        Base.metadata.create_all(db.engine)
+
+    def play(player):
+        client = app.test_client()
+        client.post("/create_character", data={"name": f"Bench{player}", "class": "warrior"})
+        latencies = []
+        for i in range(args.commands):
+            started = time.perf_counter()
+            response = client.post("/command", data={"command": COMMANDS[i % len(COMMANDS)]})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                print(f"Player {player}: HTTP {response.status_code}", file=sys.stderr)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        latencies = [l for player in executor.map(play, range(args.threads)) for l in player]
+    elapsed = time.perf_counter() - started
+
+    print(f"requests:   {len(latencies)}")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"mean:       {statistics.mean(latencies) * 1000:.1f} ms")
+    for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"{label}:        {percentile(latencies, fraction) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
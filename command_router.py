@@ -0,0 +1,66 @@
+"""
+Command Router Module for the Fantasy RPG
+
+This module maps player commands to game engine handlers. Verb aliases
+(single words like "status" or phrases like "ir para") are compiled once
+into a word trie. Resolving a command walks at most as many levels as the
+longest alias, so parsing costs the same however many verbs exist.
+"""
+
+# Argument modes for a registered alias
+EXACT = "exact"  # The alias is the whole command ("status")
+ARGUMENT = "argument"  # The alias must be followed by an argument ("ir para <local>")
+OPTIONAL = "optional"  # The alias may be followed by an argument ("olhar [ao redor]")
+
+class CommandRouter:
+    """Word trie from verb aliases to handler names."""
+
+    _ENTRY = object()  # Trie key holding the (handler name, mode) of a complete alias
+
+    def __init__(self):
+        self._root = {}
+        self.max_depth = 0
+
+    def register(self, name, aliases, mode=EXACT):
+        """
+        Register the aliases of a handler
+
+        Args:
+            name (str): The handler name (also the command type)
+            aliases (list): Verb phrases, e.g. ["ir para", "viajar para"]
+            mode (str): EXACT, ARGUMENT or OPTIONAL
+        """
+        for alias in aliases:
+            words = alias.lower().split()
+            node = self._root
+            for word in words:
+                node = node.setdefault(word, {})
+            node[self._ENTRY] = (name, mode)
+            self.max_depth = max(self.max_depth, len(words))
+
+    def resolve(self, command):
+        """
+        Find the handler for a command
+
+        Args:
+            command (str): The normalized (lowercase, stripped) command
+
+        Returns:
+            tuple: (handler name, argument), or (None, command) if no alias matches
+        """
+        words = command.split()
+        node = self._root
+        match = (None, command)
+        for depth, word in enumerate(words[:self.max_depth], 1):
+            node = node.get(word)
+            if node is None:
+                break
+            entry = node.get(self._ENTRY)
+            if entry is None:
+                continue
+            name, mode = entry
+            argument = " ".join(words[depth:])
+            # The longest alias fitting its argument mode wins
+            if (mode == EXACT and not argument) or (mode == ARGUMENT and argument) or mode == OPTIONAL:
+                match = (name, argument)
+        return match
@@ -0,0 +1,165 @@
+"""
+Entity Index Module for the Fantasy RPG
+
+This module resolves the names players type (destinations, NPCs, items)
+to world IDs. Names are folded once, when the world is initialized:
+lowercase, accents removed, punctuation and underscores turned into
+spaces. Each entity is indexed by its folded name, ID and aliases, and by
+the significant words of its name and ID, so "ir para floresta" finds
+"Floresta Sombria" with a dict lookup however large the world grows.
+
+Names that match no key exactly ("ir para flroesta", "falar com ferrero")
+are ranked by trigram similarity, as in PostgreSQL's pg_trgm, through an
+inverted index from trigrams to keys: only keys sharing a trigram with
+the typed name are scored, so typos resolve locally in microseconds
+instead of falling through to the LLM.
+"""
+
+import os
+import re
+import unicodedata
+
+# Words too common to identify an entity on their own
+STOPWORDS = {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na", "the", "of"}
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+# Fuzzy matching configuration
+MATCH_CONFIG = {
+    "threshold": float(os.environ.get("ENTITY_MATCH_THRESHOLD", 0.3)),  # Minimum similarity (0-1)
+    "item_threshold": float(os.environ.get("ITEM_MATCH_THRESHOLD", 0.45))  # Items have many similar names
+}
+
+def fold(text):
+    """
+    Fold a name for lookup
+
+    Args:
+        text (str): A name as written in the world data or by the player
+
+    Returns:
+        str: Lowercase, accent-free text with single spaces between words
+    """
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(_SEPARATORS.sub(" ", stripped).split())
+
+def trigrams(folded):
+    """
+    Get the trigrams of folded text
+
+    Each word is padded with two spaces in front and one behind, so the
+    start of a word weighs more than its end.
+
+    Args:
+        folded (str): Text already passed through fold()
+
+    Returns:
+        set: The distinct trigrams
+    """
+    result = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+class EntityIndex:
+    """Folded names, aliases and name words to entity IDs, with fuzzy lookup."""
+
+    def __init__(self, threshold=None):
+        self.threshold = MATCH_CONFIG["threshold"] if threshold is None else threshold
+        self._names = {}  # Folded full name, ID or alias -> entity IDs
+        self._words = {}  # Significant word -> entity IDs
+        self._keys = {}  # Every indexed key -> position in _key_ids
+        self._key_ids = []  # Per key: (entity IDs, trigram count)
+        self._postings = {}  # Trigram -> positions of the keys containing it
+
+    def add(self, entity_id, name, aliases=()):
+        """
+        Index an entity
+
+        Args:
+            entity_id (str): The ID in the world data
+            name (str): The display name
+            aliases (list): Other names players may use
+        """
+        for key in [fold(name), fold(entity_id)] + [fold(alias) for alias in aliases]:
+            if key:
+                self._append(self._names, key, entity_id)
+        for word in (fold(name) + " " + fold(entity_id)).split():
+            if word not in STOPWORDS:
+                self._append(self._words, word, entity_id)
+
+    def _append(self, table, key, entity_id):
+        ids = table.setdefault(key, [])
+        if entity_id not in ids:
+            ids.append(entity_id)
+
+        position = self._keys.get(key)
+        if position is None:
+            key_trigrams = trigrams(key)
+            position = self._keys[key] = len(self._key_ids)
+            self._key_ids.append(([], len(key_trigrams)))
+            for trigram in key_trigrams:
+                self._postings.setdefault(trigram, []).append(position)
+        key_ids = self._key_ids[position][0]
+        if entity_id not in key_ids:
+            key_ids.append(entity_id)
+
+    def fuzzy(self, text, candidates=None, limit=3):
+        """
+        Rank entities by the trigram similarity of their keys to a name
+
+        Args:
+            text (str): The name typed by the player
+            candidates: Optional collection of the IDs valid here
+            limit (int): Maximum number of results
+
+        Returns:
+            list: (entity ID, score) pairs at or above the threshold, best first
+        """
+        query = trigrams(fold(text))
+        if not query:
+            return []
+
+        shared = {}
+        for trigram in query:
+            for position in self._postings.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        scores = {}
+        for position, count in shared.items():
+            entity_ids, size = self._key_ids[position]
+            score = count / (len(query) + size - count)  # Shared / distinct trigrams
+            if score < self.threshold:
+                continue
+            for entity_id in entity_ids:
+                if (candidates is None or entity_id in candidates) and score > scores.get(entity_id, 0.0):
+                    scores[entity_id] = score
+        return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:limit]
+
+    def resolve(self, text, candidates=None, fuzzy=True):
+        """
+        Find the entity a player means
+
+        Args:
+            text (str): The name typed by the player
+            candidates: Optional collection of the IDs valid here (e.g. the
+                connections of the current location)
+            fuzzy (bool): Fall back to the most similar name on a miss
+
+        Returns:
+            str: The entity ID, or None if nothing matches. Full names and
+                aliases win over single words, and both over fuzzy matches;
+                ties go to the first indexed.
+        """
+        key = fold(text)
+        for table in (self._names, self._words):
+            for entity_id in table.get(key, ()):
+                if candidates is None or entity_id in candidates:
+                    return entity_id
+        if fuzzy:
+            ranked = self.fuzzy(key, candidates, limit=1)
+            if ranked:
+                return ranked[0][0]
+        return None
@@ -0,0 +1,118 @@
+"""
+Filter Terms Module for the Fantasy RPG
+
+This module persists the moderated term lists of filtering_toxicity in a
+SQLite file shared by every worker on the node. Each edit bumps a single
+version number in the same transaction, so a worker only has to read that
+number to know whether its compiled matchers are stale.
+"""
+
+import time
+import logging
+
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ("high", "medium", "low")
+
+TERMS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS filter_terms (
+    term_key TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    term TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (term_key, severity)
+);
+CREATE TABLE IF NOT EXISTS filter_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO filter_version (id, version) VALUES (1, 0);
+"""
+
+class FilterTermStore:
+    """Versioned term lists shared by all workers."""
+
+    def __init__(self, database=None):
+        self.database = database or LocalDatabase("filter_terms.db", TERMS_SCHEMA)
+
+    def version(self):
+        """Return the current version of the term lists (one indexed read)."""
+        return self.database.execute("SELECT version FROM filter_version WHERE id = 1").fetchone()[0]
+
+    def load(self, defaults=None):
+        """
+        Read the term lists and their version in one snapshot
+
+        Args:
+            defaults (dict): severity -> terms stored when the store is
+                still empty (version 0), e.g. the built-in lists
+
+        Returns:
+            tuple: (version, {severity: [terms]})
+        """
+        with self.database.transaction() as conn:
+            version = conn.execute("SELECT version FROM filter_version WHERE id = 1").fetchone()[0]
+            if version == 0 and defaults:
+                for severity, terms in defaults.items():
+                    for term in terms:
+                        self._insert(conn, term, severity)
+                version = self._bump(conn)
+            terms = {severity: [] for severity in SEVERITIES}
+            for term, severity in conn.execute("SELECT term, severity FROM filter_terms ORDER BY added_at, term_key"):
+                terms.setdefault(severity, []).append(term)
+        return version, terms
+
+    def add(self, term, severity):
+        """
+        Add a term
+
+        Returns:
+            bool: True if added, False if it was already in that list
+        """
+        with self.database.transaction() as conn:
+            if not self._insert(conn, term, severity):
+                return False
+            self._bump(conn)
+        return True
+
+    def remove(self, term, severity):
+        """
+        Remove a term
+
+        Returns:
+            bool: True if removed, False if it was not in that list
+        """
+        with self.database.transaction() as conn:
+            removed = conn.execute(
+                "DELETE FROM filter_terms WHERE term_key = ? AND severity = ?",
+                (term.lower(), severity)
+            ).rowcount
+            if not removed:
+                return False
+            self._bump(conn)
+        return True
+
+    @staticmethod
+    def _insert(conn, term, severity):
+        return conn.execute(
+            "INSERT OR IGNORE INTO filter_terms (term_key, severity, term, added_at) VALUES (?, ?, ?, ?)",
+            (term.lower(), severity, term, time.time())
+        ).rowcount > 0
+
+    @staticmethod
+    def _bump(conn):
+        conn.execute("UPDATE filter_version SET version = version + 1 WHERE id = 1")
+        return conn.execute("SELECT version FROM filter_version WHERE id = 1").fetchone()[0]
+
+_store = None
+
+def get_store():
+    """Return the process-wide term store."""
+    global _store
+    if _store is None:
+        _store = FilterTermStore()
+    return _store
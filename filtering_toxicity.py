@@ -3,10 +3,31 @@ Filtering and Toxicity Module for the Fantasy RPG
 
 This module provides functions to filter inappropriate content
 and ensure the game maintains appropriate standards.
+
+The term lists are compiled into Aho-Corasick automata (see term_matcher):
+one for player input and one for AI responses. A text is scanned once
+for every term of every list. The lists live in a versioned store shared
+by all workers (see filter_terms); each worker rebuilds its automata in
+the background when the version changes. Player input is matched in the
+folded form of text_normalizer (accents, case, leetspeak, look-alike
+letters, invisible characters and repeats removed), and so are the terms
+of the input automaton.
+
+Texts that pass the keyword checks are scored by the local classifier
+(see toxicity_model), which catches phrasing no term list covers. It is
+skipped when no weights file is installed.
 """
 
-import logging
+import os
 import re
+import time
+import logging
+import threading
+
+import filter_terms
+import toxicity_model
+from term_matcher import TermMatcher
+from text_normalizer import normalize
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -33,7 +54,8 @@ CONTENT_POLICY = {
     "language_level": "leve"  # Mild language allowed
 }
 
-# Placeholder for words/phrases that should be filtered
+# Placeholder for words/phrases that should be filtered. Built-in lists
+# seeding the term store; afterwards they mirror the terms last compiled.
 FILTERED_TERMS = {
     "high_severity": [
         # This would contain inappropriate words that should always be filtered
@@ -49,6 +71,21 @@ FILTERED_TERMS = {
     ]
 }
 
+# Indicators checked in player input
+VIOLENCE_INDICATORS = ["matar", "assassinar", "torturar", "mutilar", "decapitar", "eviscerar"]
+OUT_OF_CONTEXT_INDICATORS = ["internet", "telefone", "computador", "carro", "avião", "televisão", "arma de fogo"]
+
+# Graphic descriptions softened in AI responses
+RESPONSE_VIOLENCE_INDICATORS = ["sangue jorrando", "entranha", "desmembramento", "tortura", "agonia excruciante"]
+
+# What each kind of match in an AI response is replaced with
+RESPONSE_REPLACEMENTS = {
+    "medium": "[conteúdo removido]",
+    "low": "[termo suavizado]",
+    "violence": "[descrição de combate]"
+}
+BLOCKED_RESPONSE = "A resposta gerada continha conteúdo inadequado e foi substituída. O narrador descreve uma cena apropriada para o tema do jogo."
+
 # Standard responses for rejected content
 REJECTION_RESPONSES = {
     "general": "Sua solicitação não pode ser processada pois contém conteúdo inadequado para este jogo. \
@@ -61,6 +98,95 @@ REJECTION_RESPONSES = {
         Por favor, mantenha suas ações dentro do contexto do mundo do jogo."
 }
 
+# Term store synchronization
+TERMS_CONFIG = {
+    "check_interval": float(os.environ.get("FILTER_TERMS_CHECK_INTERVAL", 1.0))  # Seconds between version checks
+}
+
+# The lists above seed the shared term store (see filter_terms) when it is created
+_BUILTIN_TERMS = {severity: list(FILTERED_TERMS[f"{severity}_severity"]) for severity in filter_terms.SEVERITIES}
+
+_matchers = (None, None, None)  # (terms version, input matcher, response matcher)
+_last_check = 0.0
+_rebuild_lock = threading.Lock()
+
+def _build_matchers():
+    """Load the term lists from the store and compile both matchers."""
+    global _matchers
+    try:
+        version, terms = filter_terms.get_store().load(_BUILTIN_TERMS)
+    except Exception as e:
+        logger.error(f"Error loading filter terms: {e}")
+        if _matchers[1] is not None:
+            return
+        # Filter with the built-in lists until the store can be read
+        version, terms = None, _BUILTIN_TERMS
+    
+    severity_terms = [(term, severity) for severity, severity_list in terms.items() for term in severity_list]
+    input_matcher = TermMatcher(
+        (normalize(term), label) for term, label in
+        severity_terms
+        + [(term, "violence") for term in VIOLENCE_INDICATORS]
+        + [(term, "out_of_context") for term in OUT_OF_CONTEXT_INDICATORS]
+    )
+    response_matcher = TermMatcher(severity_terms + [(term, "violence") for term in RESPONSE_VIOLENCE_INDICATORS])
+    
+    for severity, severity_list in terms.items():
+        FILTERED_TERMS[f"{severity}_severity"] = list(severity_list)
+    # Swapped in one assignment; readers see the old or the new pair
+    _matchers = (version, input_matcher, response_matcher)
+    logger.info(f"Compiled filter terms version {version}")
+
+def _rebuild_in_background():
+    try:
+        _build_matchers()
+    finally:
+        _rebuild_lock.release()
+
+def load_filter_terms():
+    """Compile the matchers now (e.g. at startup) instead of on the first request."""
+    with _rebuild_lock:
+        _build_matchers()
+
+def _get_matchers():
+    """
+    Get the compiled matchers for the current term lists
+
+    The store's version is read at most once per check_interval. When it
+    changed, the matchers are rebuilt in a background thread while the
+    old ones keep serving requests.
+
+    Returns:
+        tuple: (input matcher, response matcher)
+    """
+    global _last_check
+    version, input_matcher, response_matcher = _matchers
+    if input_matcher is None:
+        with _rebuild_lock:
+            if _matchers[1] is None:
+                _build_matchers()
+        return _matchers[1], _matchers[2]
+    
+    now = time.monotonic()
+    if now - _last_check >= TERMS_CONFIG["check_interval"]:
+        _last_check = now
+        try:
+            stale = filter_terms.get_store().version() != version
+        except Exception as e:
+            logger.error(f"Error checking filter terms version: {e}")
+            stale = False
+        if stale and _rebuild_lock.acquire(blocking=False):
+            threading.Thread(target=_rebuild_in_background, name="filter-rebuild", daemon=True).start()
+    return input_matcher, response_matcher
+
+def _matched_terms(matches):
+    """Group the distinct matched terms by label."""
+    found = {"high": [], "medium": [], "low": [], "violence": [], "out_of_context": []}
+    for match in matches:
+        if match.term not in found[match.label]:
+            found[match.label].append(match.term)
+    return found
+
 def check_player_input(text):
     """
     Check player input for inappropriate content
@@ -71,51 +197,57 @@ def check_player_input(text):
     Returns:
         tuple: (is_appropriate, rejection_message)
     """
-    # Convert to lowercase for case-insensitive matching
-    text_lower = text.lower()
+    # Folded once; one pass then finds every filtered term and indicator
+    text = normalize(text)
+    found = _matched_terms(_get_matchers()[0].find(text))
     
     # Check for high severity terms first
-    for term in FILTERED_TERMS["high_severity"]:
-        if term.lower() in text_lower:
-            logger.warning(f"Player input contained high severity term: {term}")
-            return False, REJECTION_RESPONSES["offensive"]
+    if found["high"]:
+        logger.warning(f"Player input contained high severity term: {found['high'][0]}")
+        return False, REJECTION_RESPONSES["offensive"]
     
     # Check for medium severity terms
-    for term in FILTERED_TERMS["medium_severity"]:
-        if term.lower() in text_lower:
-            logger.warning(f"Player input contained medium severity term: {term}")
-            return False, REJECTION_RESPONSES["offensive"]
-    
-    # Check for low severity terms (might allow in certain contexts)
-    low_severity_matches = []
-    for term in FILTERED_TERMS["low_severity"]:
-        if term.lower() in text_lower:
-            low_severity_matches.append(term)
+    if found["medium"]:
+        logger.warning(f"Player input contained medium severity term: {found['medium'][0]}")
+        return False, REJECTION_RESPONSES["offensive"]
     
     # If there are many low severity terms, reject
-    if len(low_severity_matches) >= 3:
-        logger.warning(f"Player input contained multiple low severity terms: {low_severity_matches}")
+    if len(found["low"]) >= 3:
+        logger.warning(f"Player input contained multiple low severity terms: {found['low']}")
         return False, REJECTION_RESPONSES["offensive"]
     
     # Check for excessive violence
-    violence_indicators = ["matar", "assassinar", "torturar", "mutilar", "decapitar", "eviscerar"]
-    violence_count = sum(1 for word in violence_indicators if word in text_lower)
-    
-    if violence_count >= 2:
+    if len(found["violence"]) >= 2:
         logger.warning(f"Player input contained excessive violence indicators")
         return False, REJECTION_RESPONSES["violent"]
     
     # Check for out-of-context requests
-    out_of_context_indicators = ["internet", "telefone", "computador", "carro", "avião", "televisão", "arma de fogo"]
-    out_of_context_count = sum(1 for word in out_of_context_indicators if word in text_lower)
-    
-    if out_of_context_count >= 1:
+    if found["out_of_context"]:
         logger.warning(f"Player input contained out-of-context indicators")
         return False, REJECTION_RESPONSES["out_of_context"]
     
+    # Second stage: the classifier, for what no listed term catches
+    classifier = toxicity_model.get_classifier()
+    if classifier is not None:
+        score = classifier.score(text, normalized=True)
+        if score >= toxicity_model.TOXICITY_CONFIG["input_threshold"]:
+            logger.warning(f"Player input scored {score:.2f} by the toxicity model")
+            return False, REJECTION_RESPONSES["offensive"]
+    
     # If all checks pass, the content is appropriate
     return True, None
 
+def _classifier_blocks(response):
+    """Return True if the classifier scores an AI response as toxic."""
+    classifier = toxicity_model.get_classifier()
+    if classifier is None:
+        return False
+    score = classifier.score(response)
+    if score >= toxicity_model.TOXICITY_CONFIG["response_threshold"]:
+        logger.warning(f"AI response scored {score:.2f} by the toxicity model")
+        return True
+    return False
+
 def check_ai_response(text):
     """
     Check AI response for inappropriate content
@@ -126,45 +258,114 @@ def check_ai_response(text):
     Returns:
         tuple: (is_appropriate, replacement_text)
     """
-    # Convert to lowercase for case-insensitive matching
-    text_lower = text.lower()
+    matches = _get_matchers()[1].find(text)
+    found = _matched_terms(matches)
     
     # Check for high severity terms first
-    high_severity_found = False
-    for term in FILTERED_TERMS["high_severity"]:
-        if term.lower() in text_lower:
-            high_severity_found = True
-            text = re.sub(re.escape(term), "[conteúdo removido]", text, flags=re.IGNORECASE)
-    
-    if high_severity_found:
+    if found["high"]:
         logger.warning(f"AI response contained high severity terms that were filtered")
-        return False, "A resposta gerada continha conteúdo inadequado e foi substituída. O narrador descreve uma cena apropriada para o tema do jogo."
+        return False, BLOCKED_RESPONSE
     
-    # Check for medium severity terms
-    medium_severity_found = False
-    for term in FILTERED_TERMS["medium_severity"]:
-        if term.lower() in text_lower:
-            medium_severity_found = True
-            text = re.sub(re.escape(term), "[conteúdo removido]", text, flags=re.IGNORECASE)
+    # Second stage: the classifier scores the response as generated
+    if _classifier_blocks(text):
+        return False, BLOCKED_RESPONSE
     
-    if medium_severity_found:
+    # Same rules as ResponseStreamFilter: medium and low severity terms are
+    # removed and graphic violence softened, whatever else the text holds
+    filtered = TermMatcher.replace(text, matches, RESPONSE_REPLACEMENTS)
+    
+    if found["medium"]:
         logger.warning(f"AI response contained medium severity terms that were filtered")
         # We'll still return the filtered text, but mark it as inappropriate
-        return False, text
-    
-    # For low severity terms, just filter them but consider the response appropriate
-    for term in FILTERED_TERMS["low_severity"]:
-        if term.lower() in text_lower:
-            text = re.sub(re.escape(term), "[termo suavizado]", text, flags=re.IGNORECASE)
+        return False, filtered
     
-    # Check for excessive violence
-    violence_indicators = ["sangue jorrando", "entranha", "desmembramento", "tortura", "agonia excruciante"]
-    for indicator in violence_indicators:
-        if indicator in text_lower:
-            text = re.sub(indicator, "[descrição de combate]", text, flags=re.IGNORECASE)
+    # Low severity terms and violence alone leave the response appropriate
+    return True, filtered
+
+class ResponseStreamFilter:
+    """
+    Moderate an AI response while it streams
+    
+    feed() takes the chunks in order and returns the text that is safe to
+    send now, with medium and low severity terms and graphic violence
+    already replaced. The matcher state carries over between chunks, so
+    terms split across chunks are still found; only the last few
+    characters that could still begin a term are held back (never more
+    than the longest term). A high severity term blocks the rest of the
+    response: the caller should replace what was sent with BLOCKED_RESPONSE.
+    The classifier needs the whole response, so it runs in finish(), which
+    may block the response too.
+    """
     
-    # If all checks pass or issues were filtered, return the (possibly modified) text
-    return True, text
+    def __init__(self):
+        self._scanner = _get_matchers()[1].scanner()
+        self._text = ""  # Received but not yet emitted
+        self._offset = 0  # Position of _text in the whole response
+        self._matches = []  # Pending matches to replace
+        self._chunks = []  # The whole response, for the classifier
+        self.blocked = False
+        self.flagged = False  # Medium severity terms were removed
+    
+    def feed(self, chunk):
+        """
+        Add the next chunk of the response
+        
+        Args:
+            chunk (str): The chunk
+            
+        Returns:
+            str: Moderated text to emit now (may be empty)
+        """
+        if self.blocked:
+            return ""
+        for match in self._scanner.feed(chunk):
+            if match.label == "high":
+                logger.warning(f"Streamed AI response contained high severity terms")
+                self.blocked = True
+                self._text = ""
+                self._matches = []
+                return ""
+            if match.label in RESPONSE_REPLACEMENTS:
+                self.flagged = self.flagged or match.label == "medium"
+                self._matches.append(match)
+        self._text += chunk
+        self._chunks.append(chunk)
+        return self._emit(self._scanner.position - self._scanner.pending)
+    
+    def finish(self):
+        """
+        Return the held-back end of the response, once the stream is over
+        
+        Check blocked afterwards: the classifier may block the response here.
+        """
+        if self.blocked:
+            return ""
+        if _classifier_blocks("".join(self._chunks)):
+            self.blocked = True
+            return ""
+        return self._emit(self._scanner.position)
+    
+    def _emit(self, boundary):
+        # Leftmost-longest replacement up to the boundary; a match that
+        # straddles it is replaced whole, moving the boundary to its end
+        boundary = max(boundary, self._offset)
+        parts = []
+        cursor = self._offset
+        for match in sorted(self._matches, key=lambda m: (m.start, -m.end)):
+            if match.start < cursor:
+                continue
+            if match.start >= boundary:
+                break
+            parts.append(self._text[cursor - self._offset:match.start - self._offset])
+            parts.append(RESPONSE_REPLACEMENTS[match.label])
+            cursor = match.end
+            boundary = max(boundary, cursor)
+        parts.append(self._text[cursor - self._offset:boundary - self._offset])
+        
+        self._text = self._text[boundary - self._offset:]
+        self._offset = boundary
+        self._matches = [match for match in self._matches if match.start >= boundary]
+        return "".join(parts)
 
 def add_safety_prompt_prefix(prompt):
     """
@@ -250,9 +451,9 @@ def filter_image_prompt(prompt):
         logger.info("Truncated long image prompt")
     
     # Check for inappropriate terms in all severity levels
-    for term in FILTERED_TERMS["high_severity"] + FILTERED_TERMS["medium_severity"]:
-        if term.lower() in prompt_lower:
-            logger.warning(f"Image prompt contained inappropriate term: {term}")
+    for match in _get_matchers()[1].find(prompt_lower):
+        if match.label in ("high", "medium"):
+            logger.warning(f"Image prompt contained inappropriate term: {match.term}")
             return False, "Cena de fantasia apropriada para o jogo"
     
     # Check for problematic image request patterns
@@ -289,6 +490,9 @@ def update_filter_database(term, severity, add_or_remove="add"):
     """
     Update the filter database with a new term or remove an existing one
     
+    The change is saved in the shared term store and reaches every worker
+    without a restart.
+    
     Args:
         term (str): The term to add or remove
         severity (str): The severity level ('high', 'medium', 'low')
@@ -301,30 +505,52 @@ def update_filter_database(term, severity, add_or_remove="add"):
         logger.error(f"Invalid severity level: {severity}")
         return False
     
-    severity_key = f"{severity}_severity"
+    if add_or_remove not in ["add", "remove"]:
+        logger.error(f"Invalid operation: {add_or_remove}")
+        return False
     
-    if add_or_remove == "add":
-        if term.lower() not in [t.lower() for t in FILTERED_TERMS[severity_key]]:
-            FILTERED_TERMS[severity_key].append(term)
-            logger.info(f"Added '{term}' to {severity} severity filter")
-            return True
+    store = filter_terms.get_store()
+    try:
+        if add_or_remove == "add":
+            changed = store.add(term, severity)
         else:
+            changed = store.remove(term, severity)
+    except Exception as e:
+        logger.error(f"Error updating filter terms: {e}")
+        return False
+    
+    if not changed:
+        if add_or_remove == "add":
             logger.warning(f"Term '{term}' already exists in {severity} severity filter")
-            return False
-    
-    elif add_or_remove == "remove":
-        for i, existing_term in enumerate(FILTERED_TERMS[severity_key]):
-            if term.lower() == existing_term.lower():
-                FILTERED_TERMS[severity_key].pop(i)
-                logger.info(f"Removed '{term}' from {severity} severity filter")
-                return True
-        
-        logger.warning(f"Term '{term}' not found in {severity} severity filter")
+        else:
+            logger.warning(f"Term '{term}' not found in {severity} severity filter")
         return False
     
+    # This worker applies the edit at once; the others on their next version check
+    load_filter_terms()
+    if add_or_remove == "add":
+        logger.info(f"Added '{term}' to {severity} severity filter")
     else:
-        logger.error(f"Invalid operation: {add_or_remove}")
-        return False
+        logger.info(f"Removed '{term}' from {severity} severity filter")
+    return True
+
+def prepare_safe_prompt(prompt):
+    """
+    Check a prompt and wrap it with the safety instructions
+    
+    Args:
+        prompt (str): The original prompt
+        
+    Returns:
+        tuple: (is_appropriate, safe_prompt or rejection_message)
+    """
+    is_appropriate, rejection_message = check_player_input(prompt)
+    if not is_appropriate:
+        return False, rejection_message
+    
+    safe_prompt = add_safety_prompt_prefix(prompt)
+    safe_prompt = add_safety_prompt_suffix(safe_prompt)
+    return True, safe_prompt
 
 def safe_ai_request(prompt, original_function, *args, **kwargs):
     """
@@ -338,23 +564,15 @@ def safe_ai_request(prompt, original_function, *args, **kwargs):
     Returns:
         The result of the AI function call with safety measures applied
     """
-    # First check if the prompt itself is appropriate
-    is_appropriate, rejection_message = check_player_input(prompt)
+    # First check if the prompt itself is appropriate, then apply safety measures
+    is_appropriate, safe_prompt = prepare_safe_prompt(prompt)
     if not is_appropriate:
-        return rejection_message
-    
-    # Apply safety measures to the prompt
-    safe_prompt = add_safety_prompt_prefix(prompt)
-    safe_prompt = add_safety_prompt_suffix(safe_prompt)
+        return safe_prompt
     
     # Call the original AI function with the safe prompt
     result = original_function(safe_prompt, *args, **kwargs)
     
-    # Check the AI response
-    response_appropriate, filtered_response = check_ai_response(result)
-    
-    # Return either the original response or the filtered version
-    if response_appropriate:
-        return result
-    else:
-        return filtered_response
\ No newline at end of file
+    # Check the AI response; even an appropriate one has its low severity
+    # terms and graphic violence replaced, as in the streamed narration
+    _, filtered_response = check_ai_response(result)
+    return filtered_response
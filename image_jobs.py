@@ -0,0 +1,230 @@
+"""
+Image Jobs Module for the Fantasy RPG
+
+This module moves image generation off the command's critical path. Jobs
+are queued in a SQLite file shared by all workers and processed by a small
+pool of background threads in every worker. A job being processed holds a
+lease; if its worker dies, the lease expires and another worker picks the
+job up again, so queued images survive restarts.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import metrics
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Job queue configuration
+JOB_CONFIG = {
+    "workers": int(os.environ.get("IMAGE_JOB_WORKERS", 2)),
+    "lease_seconds": float(os.environ.get("IMAGE_JOB_LEASE", 120)),  # Time before a running job is retried
+    "max_attempts": 3,
+    "poll_interval": 1.0,  # Idle workers also poll so jobs queued by other workers are seen
+    "retention_seconds": 24 * 3600  # Finished jobs kept for polling clients
+}
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    image_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    image_url TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_image_jobs_status ON image_jobs (status, id);
+"""
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class ImageJobQueue:
+    """Persistent image generation queue with an in-process worker pool."""
+
+    def __init__(self, generate, fallback_url, database=None, workers=None):
+        """
+        Args:
+            generate: Callable taking a prompt and returning an image URL;
+                returning fallback_url counts as a failed attempt
+            fallback_url (str): URL stored when a job fails for good
+            database (LocalDatabase, optional): The shared queue database
+            workers (int, optional): Worker threads in this process
+        """
+        self.generate = generate
+        self.fallback_url = fallback_url
+        self.database = database or LocalDatabase("image_jobs.db", JOB_SCHEMA)
+        self.workers = workers or JOB_CONFIG["workers"]
+        self._listeners = []
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """
+        Register a callback run when a job finishes
+
+        Args:
+            listener: Callable taking the finished job dict
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start the worker threads in this process (again after a fork)."""
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"image-job-{i}", daemon=True).start()
+            logger.info(f"Started {self.workers} image job workers")
+
+    def enqueue(self, prompt, image_id=None):
+        """
+        Queue an image generation
+
+        Args:
+            prompt (str): The image prompt
+            image_id (int, optional): The GameImage row that receives the URL
+
+        Returns:
+            int: The job id
+        """
+        self.start()
+        now = time.time()
+        cursor = self.database.execute(
+            "INSERT INTO image_jobs (prompt, image_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (prompt, image_id, PENDING, now, now)
+        )
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        """
+        Get a job's state
+
+        Args:
+            job_id (int): The job id
+
+        Returns:
+            dict: id, image_id, status and image_url, or None if unknown
+        """
+        row = self.database.execute(
+            "SELECT id, image_id, status, image_url FROM image_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"id": row[0], "image_id": row[1], "status": row[2], "image_url": row[3]}
+
+    def pending_count(self):
+        """Return the number of jobs waiting or running."""
+        row = self.database.execute(
+            "SELECT COUNT(*) FROM image_jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+        ).fetchone()
+        return row[0]
+
+    def wait(self, job_id, timeout):
+        """
+        Wait for a job to finish
+
+        Args:
+            job_id (int): The job id
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            dict: The job, finished or not
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if not job or job["status"] in (DONE, FAILED) or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.2)
+
+    def _claim(self):
+        now = time.time()
+        with self.database.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, prompt, image_id, attempts FROM image_jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (PENDING, RUNNING, now)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE image_jobs SET status = ?, attempts = attempts + 1, lease_expires = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, now + JOB_CONFIG["lease_seconds"], now, row[0])
+            )
+        return {"id": row[0], "prompt": row[1], "image_id": row[2], "attempts": row[3] + 1}
+
+    def _finish(self, job, status, image_url):
+        now = time.time()
+        self.database.execute(
+            "UPDATE image_jobs SET status = ?, image_url = ?, lease_expires = NULL, updated_at = ? WHERE id = ?",
+            (status, image_url, now, job["id"])
+        )
+        self.database.execute(
+            "DELETE FROM image_jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, now - JOB_CONFIG["retention_seconds"])
+        )
+        finished = {"id": job["id"], "image_id": job["image_id"], "status": status, "image_url": image_url}
+        for listener in self._listeners:
+            try:
+                listener(finished)
+            except Exception as e:
+                logger.error(f"Error in image job listener: {e}")
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming image job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(JOB_CONFIG["poll_interval"])
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        try:
+            started = time.perf_counter()
+            image_url = self.generate(job["prompt"])
+            metrics.STAGE_DURATION.observe(time.perf_counter() - started, "image_job", "background")
+            if not image_url or image_url == self.fallback_url:
+                # generate_image reports errors with the placeholder instead of raising
+                raise RuntimeError("image generation returned the placeholder")
+            self._finish(job, DONE, image_url)
+        except Exception as e:
+            logger.error(f"Error processing image job {job['id']}: {e}")
+            if job["attempts"] >= JOB_CONFIG["max_attempts"]:
+                self._finish(job, FAILED, self.fallback_url)
+            else:
+                # Back to the queue for another attempt
+                self.database.execute(
+                    "UPDATE image_jobs SET status = ?, lease_expires = NULL, updated_at = ? WHERE id = ?",
+                    (PENDING, time.time(), job["id"])
+                )
+
+_queue = None
+
+def get_queue():
+    """Return the process-wide image job queue, creating it on first use."""
+    global _queue
+    if _queue is None:
+        from ai_service import generate_image, create_placeholder_image
+        _queue = ImageJobQueue(generate_image, create_placeholder_image())
+    return _queue
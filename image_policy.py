@@ -0,0 +1,58 @@
+"""
+Image Policy Module for the Fantasy RPG
+
+This module decides how each command's scene image is produced. The game
+engine tags its result with a policy; only turns that change what the
+player sees pay for a generation:
+
+- NEW_IMAGE: generate an image from the result's image prompt. Results
+  showing a place also carry a scene key (location, time_of_day), and the
+  character's last image of that scene is reused when one exists.
+- REUSE_IMAGE: keep the current scene image (help, status, failed moves...).
+- STATIC_IMAGE: show a fixed asset without generating: rejected input, or
+  the pre-rendered scene image (see scene_assets) in result["static_image_url"].
+"""
+
+NEW_IMAGE = "new"
+REUSE_IMAGE = "reuse"
+STATIC_IMAGE = "static"
+
+# Fixed assets for STATIC_IMAGE results, by result["static_image"]
+STATIC_IMAGES = {
+    "default": "/static/placeholder.svg"
+}
+
+def get_policy(result):
+    """
+    Read the image policy of an engine result
+
+    Args:
+        result (dict): The result of GameEngine.process_command
+
+    Returns:
+        str: NEW_IMAGE, REUSE_IMAGE or STATIC_IMAGE; results without a
+            policy get a new image, as before the policy existed
+    """
+    policy = result.get("image_policy", NEW_IMAGE)
+    if policy not in (NEW_IMAGE, REUSE_IMAGE, STATIC_IMAGE):
+        return NEW_IMAGE
+    return policy
+
+def get_scene(result):
+    """
+    Get the (location, time_of_day) scene a result shows
+
+    Args:
+        result (dict): The result of GameEngine.process_command
+
+    Returns:
+        tuple: (location, time_of_day), or None if the image is specific to the action
+    """
+    scene = result.get("scene")
+    return tuple(scene) if scene else None
+
+def get_static_url(result):
+    """Return the fixed asset URL for a STATIC_IMAGE result."""
+    if result.get("static_image_url"):
+        return result["static_image_url"]
+    return STATIC_IMAGES.get(result.get("static_image", "default"), STATIC_IMAGES["default"])
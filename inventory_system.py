@@ -3,13 +3,17 @@ Inventory System Module for the Fantasy RPG
 
 This module manages the character's inventory, including items, 
 equipment, and currency. It provides functions for adding, removing,
-and using items.
+and using items, and InventoryAccessor, which loads and saves a
+character's inventory.
 """
 
 import json
 import logging
 import os
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import object_session
 from ai_service import generate_text_response, generate_image
+from models import GameState, InventoryItem, EquippedSlot
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -170,6 +174,12 @@ BASE_ITEMS = {
     }
 }
 
+# Stored inventory format. Version 2 keeps only item ids, quantities and
+# per-instance stat deltas; catalog data is resolved from BASE_ITEMS.
+# Equipped items keep their deltas in "equipped_stats", by slot.
+# Rows without a version embed an "item_data" copy of the catalog entry.
+INVENTORY_FORMAT_VERSION = 2
+
 def initialize_inventory(character_id=None):
     """
     Initialize a new inventory for a character
@@ -201,6 +211,297 @@ def initialize_inventory(character_id=None):
     
     return inventory
 
+def get_item_data(inventory, item_id, slot=None):
+    """
+    Resolve an inventory entry against the item catalog
+
+    Args:
+        inventory (dict): The inventory dictionary
+        item_id (str): The ID of the item
+        slot (str, optional): Resolve the item equipped in this slot
+            instead of the carried stack
+
+    Returns:
+        dict: The BASE_ITEMS entry, with the stats of this instance applied
+            (e.g. its durability), or None if the item is not in the catalog
+    """
+    item = BASE_ITEMS.get(item_id)
+    if item is None:
+        return None
+    if slot is not None:
+        stats = inventory.get("equipped_stats", {}).get(slot)
+    else:
+        stats = inventory.get("items", {}).get(item_id, {}).get("stats")
+    if not stats:
+        return item
+    return dict(item, stats=dict(item.get("stats", {}), **stats))
+
+def _stat_deltas(item_id, stats):
+    # Only the stats that differ from the catalog are worth storing
+    base_stats = BASE_ITEMS.get(item_id, {}).get("stats", {})
+    return {name: value for name, value in stats.items() if base_stats.get(name) != value}
+
+def pack_inventory(inventory):
+    """
+    Encode an inventory in the compact stored format
+
+    Args:
+        inventory (dict): The inventory dictionary
+
+    Returns:
+        str: JSON with each item stored as its quantity, or as
+            {"quantity", "stats"} when the instance has stat deltas
+    """
+    items = {}
+    for item_id, entry in inventory.get("items", {}).items():
+        stats = entry.get("stats")
+        items[item_id] = {"quantity": entry["quantity"], "stats": stats} if stats else entry["quantity"]
+    packed = dict(inventory, items=items, version=INVENTORY_FORMAT_VERSION)
+    return json.dumps(packed, separators=(",", ":"))
+
+def unpack_inventory(text):
+    """
+    Decode a stored inventory, upgrading rows in the old format
+
+    Args:
+        text (str): The GameState.inventory JSON
+
+    Returns:
+        tuple: (inventory dict, upgraded), where upgraded is True if the row
+            was in the old format and should be written back
+
+    Raises:
+        ValueError: If the JSON is invalid or not an inventory
+    """
+    inventory = json.loads(text)
+    if not isinstance(inventory, dict):
+        raise ValueError("Formato de inventário inválido")
+    upgraded = inventory.pop("version", None) != INVENTORY_FORMAT_VERSION
+    items = {}
+    for item_id, entry in inventory.get("items", {}).items():
+        if isinstance(entry, int):
+            items[item_id] = {"quantity": entry}
+            continue
+        items[item_id] = {"quantity": entry.get("quantity", 1)}
+        if "stats" in entry:
+            stats = entry["stats"]
+        else:
+            # Old rows carry a full copy of the catalog entry
+            stats = _stat_deltas(item_id, entry.get("item_data", {}).get("stats", {}))
+        if stats:
+            items[item_id]["stats"] = stats
+    inventory["items"] = items
+    return inventory, upgraded
+
+def _dump_stats(stats):
+    return json.dumps(stats, sort_keys=True, separators=(",", ":")) if stats else None
+
+def _upsert(session, model, values, key_columns):
+    # INSERT ... ON CONFLICT DO UPDATE on a single row, in the dialect in use
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(model).values(**values)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={name: value for name, value in values.items() if name not in key_columns}
+    ))
+
+class InventoryAccessor:
+    """
+    The inventory of one GameState for the duration of a request
+
+    Inventories live in the InventoryItem and EquippedSlot tables, with gold
+    and carried weight on the GameState row. They are read at most once, on
+    first access, into the inventory dict the functions of this module work
+    on; every caller shares that live dict through `data` and calls
+    mark_dirty() after changing it. flush() compares the dict with what was
+    read and runs one single-row UPSERT or DELETE per changed item or slot,
+    in the request's transaction.
+
+    Game states not yet flagged inventory_migrated keep their inventory in
+    the legacy JSON column (either format, see unpack_inventory); it is
+    moved to the tables by the next flush, and replaced by a new inventory
+    if it is missing or invalid. Game states outside a session (the handler
+    benchmark) keep using the JSON column.
+    """
+
+    def __init__(self, game_state, character_id=None):
+        self.game_state = game_state
+        self.character_id = character_id if character_id is not None else game_state.character_id
+        self.dirty = False
+        self._data = None
+        self._stored = ({}, {})  # Rows as read: ({item_id: (quantity, stats)}, {slot: (item_id, stats)})
+
+    @property
+    def data(self):
+        """The live inventory dict, read on first access."""
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _session(self):
+        if self.game_state.id is None:
+            return None
+        return object_session(self.game_state)
+
+    def _load(self):
+        session = self._session()
+        if session is not None and self.game_state.inventory_migrated:
+            return self._load_tables(session)
+
+        # Legacy JSON inventory, moved to the tables by the next flush
+        self.dirty = session is not None
+        if not self.game_state.inventory:
+            logger.warning(f"Inventário vazio para personagem {self.character_id}, inicializando novo")
+        else:
+            try:
+                inventory, upgraded = unpack_inventory(self.game_state.inventory)
+                self.dirty = self.dirty or upgraded
+                return inventory
+            except (TypeError, ValueError, AttributeError, KeyError) as e:
+                logger.error(f"Inventário inválido para personagem {self.character_id}: {e}")
+        # The repaired inventory is saved with the rest of the request
+        self.dirty = True
+        return initialize_inventory(self.character_id)
+
+    def _load_tables(self, session):
+        game_state_id = self.game_state.id
+        items = {}
+        stored_items = {}
+        for item_id, quantity, stats in session.execute(
+            select(InventoryItem.item_id, InventoryItem.quantity, InventoryItem.stats)
+            .where(InventoryItem.game_state_id == game_state_id)
+        ):
+            items[item_id] = {"quantity": quantity}
+            if stats:
+                items[item_id]["stats"] = json.loads(stats)
+            stored_items[item_id] = (quantity, stats)
+
+        equipped_stats = {}
+        stored_slots = {}
+        for slot, item_id, stats in session.execute(
+            select(EquippedSlot.slot, EquippedSlot.item_id, EquippedSlot.stats)
+            .where(EquippedSlot.game_state_id == game_state_id)
+        ):
+            if stats:
+                equipped_stats[slot] = json.loads(stats)
+            stored_slots[slot] = (item_id, stats)
+        self._stored = (stored_items, stored_slots)
+
+        inventory = initialize_inventory(self.character_id)
+        inventory["gold"] = self.game_state.gold
+        if self.game_state.max_weight is not None:
+            inventory["capacity"]["max_weight"] = self.game_state.max_weight
+        inventory["capacity"]["current_weight"] = self.game_state.current_weight or 0
+        inventory["equipped"].update({slot: item_id for slot, (item_id, _) in stored_slots.items()})
+        if equipped_stats:
+            inventory["equipped_stats"] = equipped_stats
+        inventory["items"] = items
+        return inventory
+
+    def replace(self, inventory):
+        """Replace the whole inventory (e.g. a new character's starting one)."""
+        self._data = inventory
+        self.dirty = True
+
+    def mark_dirty(self):
+        """Record that the inventory dict was changed."""
+        self.dirty = True
+
+    def flush(self):
+        """
+        Write the changed items and slots back if the inventory changed
+
+        Returns:
+            bool: True if anything was written
+        """
+        if not self.dirty or self._data is None:
+            return False
+        session = self._session()
+        if session is None:
+            self.game_state.inventory = pack_inventory(self._data)
+            self.dirty = False
+            return True
+
+        inventory = self._data
+        game_state_id = self.game_state.id
+        stored_items, stored_slots = self._stored
+
+        items = {
+            item_id: (entry["quantity"], _dump_stats(entry.get("stats")))
+            for item_id, entry in inventory.get("items", {}).items()
+        }
+        for item_id, (quantity, stats) in items.items():
+            if stored_items.get(item_id) != (quantity, stats):
+                _upsert(session, InventoryItem, {
+                    "game_state_id": game_state_id,
+                    "item_id": item_id,
+                    "quantity": quantity,
+                    "stats": stats
+                }, ("game_state_id", "item_id"))
+        for item_id in stored_items.keys() - items.keys():
+            session.execute(delete(InventoryItem).where(
+                InventoryItem.game_state_id == game_state_id,
+                InventoryItem.item_id == item_id
+            ))
+
+        equipped_stats = inventory.get("equipped_stats", {})
+        slots = {
+            slot: (item_id, _dump_stats(equipped_stats.get(slot)))
+            for slot, item_id in inventory.get("equipped", {}).items() if item_id
+        }
+        for slot, (item_id, stats) in slots.items():
+            if stored_slots.get(slot) != (item_id, stats):
+                _upsert(session, EquippedSlot, {
+                    "game_state_id": game_state_id,
+                    "slot": slot,
+                    "item_id": item_id,
+                    "stats": stats
+                }, ("game_state_id", "slot"))
+        for slot in stored_slots.keys() - slots.keys():
+            session.execute(delete(EquippedSlot).where(
+                EquippedSlot.game_state_id == game_state_id,
+                EquippedSlot.slot == slot
+            ))
+
+        capacity = inventory.get("capacity", {})
+        self.game_state.gold = inventory.get("gold", 0)
+        self.game_state.current_weight = capacity.get("current_weight", 0)
+        self.game_state.max_weight = capacity.get("max_weight")
+        if not self.game_state.inventory_migrated:
+            # Moved to the tables; the JSON column is no longer read
+            self.game_state.inventory_migrated = True
+            self.game_state.inventory = ""
+
+        self._stored = (items, slots)
+        self.dirty = False
+        return True
+
+def get_item_owners(session, item_id):
+    """
+    Find the characters carrying or wearing an item
+
+    Args:
+        session: The SQLAlchemy session
+        item_id (str): The ID of the item
+
+    Returns:
+        list: The IDs of the characters, in ascending order
+    """
+    carried = select(InventoryItem.game_state_id).where(InventoryItem.item_id == item_id)
+    equipped = select(EquippedSlot.game_state_id).where(EquippedSlot.item_id == item_id)
+    return list(session.execute(
+        select(GameState.character_id)
+        .where(GameState.id.in_(carried.union(equipped)))
+        .order_by(GameState.character_id)
+    ).scalars())
+
+def get_total_gold(session):
+    """Return the gold held by every character whose inventory is in the tables."""
+    return session.execute(select(func.coalesce(func.sum(GameState.gold), 0))).scalar()
+
 def add_item(inventory, item_id, quantity=1):
     """
     Add an item to the inventory
@@ -230,10 +531,7 @@ def add_item(inventory, item_id, quantity=1):
     if item_id in inventory["items"]:
         inventory["items"][item_id]["quantity"] += quantity
     else:
-        inventory["items"][item_id] = {
-            "quantity": quantity,
-            "item_data": item
-        }
+        inventory["items"][item_id] = {"quantity": quantity}
     
     # Update inventory weight
     inventory["capacity"]["current_weight"] += total_new_weight
@@ -258,23 +556,25 @@ def remove_item(inventory, item_id, quantity=1):
         logger.error(f"Item with ID {item_id} not found in inventory")
         return inventory, False
     
+    item = get_item_data(inventory, item_id)
+    
     # Check if there's enough quantity
     if inventory["items"][item_id]["quantity"] < quantity:
-        logger.error(f"Not enough {BASE_ITEMS[item_id]['name']} in inventory")
+        logger.error(f"Not enough {item['name']} in inventory")
         return inventory, False
     
     # Remove the item
     inventory["items"][item_id]["quantity"] -= quantity
     
     # Update inventory weight
-    item_weight = BASE_ITEMS[item_id]["weight"] * quantity
+    item_weight = item["weight"] * quantity
     inventory["capacity"]["current_weight"] -= item_weight
     
     # Remove the item entirely if quantity is 0
     if inventory["items"][item_id]["quantity"] <= 0:
         del inventory["items"][item_id]
     
-    logger.info(f"Removed {quantity} {BASE_ITEMS[item_id]['name']} from inventory")
+    logger.info(f"Removed {quantity} {item['name']} from inventory")
     return inventory, True
 
 def use_item(inventory, item_id, character_stats=None):
@@ -293,7 +593,7 @@ def use_item(inventory, item_id, character_stats=None):
     if item_id not in inventory["items"]:
         return inventory, character_stats, "Item não encontrado no inventário."
     
-    item = BASE_ITEMS[item_id]
+    item = get_item_data(inventory, item_id)
     
     # Check if the item is consumable
     if not item.get("consumable", False):
@@ -334,7 +634,7 @@ def equip_item(inventory, item_id, character_stats=None):
     if item_id not in inventory["items"]:
         return inventory, character_stats, "Item não encontrado no inventário."
     
-    item = BASE_ITEMS[item_id]
+    item = get_item_data(inventory, item_id)
     
     # Check if the item is equippable
     if item["category"] not in ["weapon", "armor", "accessory"]:
@@ -356,22 +656,17 @@ def equip_item(inventory, item_id, character_stats=None):
         if "intelligence" in requirements and character_stats["intelligence"] < requirements["intelligence"]:
             return inventory, character_stats, f"Inteligência {requirements['intelligence']} necessária para equipar {item['name']}."
     
-    # Unequip current item in the slot if any
+    # The equipped instance takes the stats of its stack
     slot = item["category"]
-    current_equipped = inventory["equipped"][slot]
+    stats = inventory["items"][item_id].get("stats")
     
-    if current_equipped:
-        # Add the currently equipped item back to inventory
-        if current_equipped in inventory["items"]:
-            inventory["items"][current_equipped]["quantity"] += 1
-        else:
-            inventory["items"][current_equipped] = {
-                "quantity": 1,
-                "item_data": BASE_ITEMS[current_equipped]
-            }
+    # Unequip current item in the slot if any
+    inventory, _ = unequip_item(inventory, slot)
     
     # Equip the new item
     inventory["equipped"][slot] = item_id
+    if stats:
+        inventory.setdefault("equipped_stats", {})[slot] = dict(stats)
     
     # Remove the equipped item from inventory count
     inventory["items"][item_id]["quantity"] -= 1
@@ -382,6 +677,39 @@ def equip_item(inventory, item_id, character_stats=None):
     
     return inventory, character_stats, result_message
 
+def unequip_item(inventory, slot):
+    """
+    Move the item equipped in a slot back to the carried items
+    
+    The item keeps its stats when it starts a new stack; a stack of the
+    same item already carried keeps its own stats (stacks share theirs).
+    
+    Args:
+        inventory (dict): The inventory dictionary
+        slot (str): 'weapon', 'armor' or 'accessory'
+        
+    Returns:
+        tuple: (updated_inventory, True if an item was unequipped)
+    """
+    item_id = inventory.get("equipped", {}).get(slot)
+    if not item_id:
+        return inventory, False
+    
+    equipped_stats = inventory.get("equipped_stats", {})
+    stats = equipped_stats.pop(slot, None)
+    if not equipped_stats:
+        inventory.pop("equipped_stats", None)
+    
+    # Add the equipped item back to inventory
+    if item_id in inventory["items"]:
+        inventory["items"][item_id]["quantity"] += 1
+    else:
+        inventory["items"][item_id] = {"quantity": 1}
+        if stats:
+            inventory["items"][item_id]["stats"] = stats
+    inventory["equipped"][slot] = None
+    return inventory, True
+
 def get_inventory_summary(inventory):
     """
     Get a summary of the inventory contents
@@ -422,9 +750,9 @@ def get_inventory_summary(inventory):
         # Add equipped items
         summary += "Equipado:\n"
         for slot, item_id in inventory["equipped"].items():
-            if item_id and item_id in BASE_ITEMS:
-                item_name = BASE_ITEMS[item_id]["name"]
-                summary += f"  {slot.capitalize()}: {item_name}\n"
+            item = get_item_data(inventory, item_id, slot) if item_id else None
+            if item:
+                summary += f"  {slot.capitalize()}: {item['name']}\n"
             else:
                 summary += f"  {slot.capitalize()}: Nada equipado\n"
         
@@ -439,17 +767,18 @@ def get_inventory_summary(inventory):
         items_by_category = {}
         for item_id, item_data in inventory["items"].items():
             # Skip if item_id not in BASE_ITEMS
-            if item_id not in BASE_ITEMS:
+            item = get_item_data(inventory, item_id)
+            if item is None:
                 logger.warning(f"Item desconhecido no inventário: {item_id}")
                 continue
                 
-            category = BASE_ITEMS[item_id]["category"]
+            category = item["category"]
             if category not in items_by_category:
                 items_by_category[category] = []
             
             items_by_category[category].append({
                 "id": item_id,
-                "name": BASE_ITEMS[item_id]["name"],
+                "name": item["name"],
                 "quantity": item_data.get("quantity", 1)
             })
         
@@ -564,7 +893,7 @@ def save_inventory_to_file(inventory, character_id):
     try:
         filename = f"inventory_{character_id}.json"
         with open(filename, "w") as f:
-            json.dump(inventory, f, indent=2)
+            f.write(pack_inventory(inventory))
         return True
     except Exception as e:
         logger.error(f"Error saving inventory: {e}")
@@ -584,7 +913,7 @@ def load_inventory_from_file(character_id):
         filename = f"inventory_{character_id}.json"
         if os.path.exists(filename):
             with open(filename, "r") as f:
-                inventory = json.load(f)
+                inventory, _ = unpack_inventory(f.read())
             return inventory
         else:
             return initialize_inventory(character_id)
@@ -0,0 +1,78 @@
+"""
+Local Store Module for the Fantasy RPG
+
+This module manages the small SQLite files that every gunicorn worker on a
+node shares (response cache, asset indexes, job queues). Each thread gets
+its own connection and the databases run in WAL mode so readers never block
+the writer.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Directory holding the shared SQLite files
+LOCAL_STORE_DIR = os.environ.get(
+    "LOCAL_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "local")
+)
+
+def get_path(filename):
+    """
+    Get the absolute path of a file inside the local store directory
+
+    Args:
+        filename (str): The file name
+
+    Returns:
+        str: The absolute path
+    """
+    return os.path.join(LOCAL_STORE_DIR, filename)
+
+class LocalDatabase:
+    """A SQLite database shared by all workers, with one connection per thread."""
+
+    def __init__(self, filename, schema):
+        """
+        Args:
+            filename (str): The database file name inside LOCAL_STORE_DIR
+            schema (str): SQL script creating the tables (must be idempotent)
+        """
+        self.path = get_path(filename)
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        """Execute a single statement in autocommit mode."""
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Run several statements atomically, holding the write lock."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
@@ -0,0 +1,290 @@
+"""
+Metrics Module for the Fantasy RPG
+
+This module times the stages of each request and aggregates them for
+monitoring. Code on the hot path wraps each stage in `span(name)`. The
+spans of the current request are sent back in a Server-Timing header and
+folded into latency histograms labelled by command type. Counters and
+histograms are rendered in the Prometheus text format for /metrics.
+A streamed response outlives its view: the view detaches the request's
+timer and the stream finishes it once the last event is sent.
+Values are kept per process, so with several gunicorn workers each worker
+reports its own series.
+"""
+
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values]
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = []
+        labelnames = self.labelnames + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labelnames, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(labelnames, labels + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+class Registry:
+    """Holds the metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Register a callback producing gauges when /metrics is scraped
+
+        Args:
+            collector: Callable returning a list of
+                (name, documentation, labelnames, [(label values, value), ...])
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+                continue
+            for name, documentation, labelnames, samples in gauges:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.histogram(
+    "rpg_request_duration_seconds", "Request latency by endpoint and command type",
+    ("endpoint", "command_type")
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "rpg_stage_duration_seconds", "Time spent in each request stage",
+    ("stage", "command_type")
+)
+COMMANDS = REGISTRY.counter(
+    "rpg_commands_total", "Commands processed by game engine branch", ("command_type",)
+)
+AI_TOKENS = REGISTRY.counter(
+    "rpg_ai_tokens_total", "Tokens billed by the AI provider", ("model",)
+)
+
+class RequestTimer:
+    """
+    The spans recorded during one request
+
+    Calls the request runs on other threads (see ai_pipeline) add their
+    spans too, so adding is locked; spans of parallel calls may sum to more
+    than the request's duration. Spans ending after the request finished
+    are dropped.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.command_type = "none"
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = {}  # name -> [total seconds, count], in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            if self.duration is not None:
+                return
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def snapshot(self):
+        """Return a copy of the spans, safe to iterate while calls still add."""
+        with self._lock:
+            return {name: list(entry) for name, entry in self.spans.items()}
+
+    def finish(self):
+        """Fix the duration and return the final spans."""
+        with self._lock:
+            self.duration = time.perf_counter() - self.started
+        return self.snapshot()
+
+_current = contextvars.ContextVar("metrics_request", default=None)
+
+def begin_request(endpoint):
+    """Start collecting spans for the current request."""
+    _current.set(RequestTimer(endpoint))
+
+def detach_request():
+    """
+    Take over the current request's timer, e.g. for a streamed response
+
+    end_request() then ignores the request; the caller adds the spans of
+    the stream to the timer and passes it to end_request() when done.
+
+    Returns:
+        RequestTimer: The timer, or None if no request was started
+    """
+    timer = _current.get()
+    _current.set(None)
+    return timer
+
+def end_request(timer=None):
+    """
+    Stop collecting spans and record the request in the histograms
+
+    Args:
+        timer (RequestTimer, optional): A timer taken with detach_request();
+            by default the current request's
+
+    Returns:
+        RequestTimer: The finished timer, or None if no request was started
+    """
+    if timer is None:
+        timer = _current.get()
+        if timer is None:
+            return None
+        _current.set(None)
+    spans = timer.finish()
+    REQUEST_DURATION.observe(timer.duration, timer.endpoint, timer.command_type)
+    for name, (seconds, _) in spans.items():
+        STAGE_DURATION.observe(seconds, name, timer.command_type)
+    return timer
+
+def set_command_type(command_type):
+    """Label the current request with the game engine branch that handled it."""
+    COMMANDS.inc(command_type)
+    timer = _current.get()
+    if timer is not None:
+        timer.command_type = command_type
+
+def record_tokens(model, tokens):
+    """Count the tokens billed for a provider call."""
+    if tokens:
+        AI_TOKENS.inc(model, amount=tokens)
+
+@contextmanager
+def span(name):
+    """Time a stage of the current request; a no-op outside a request."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+def record_span(name, seconds):
+    """Add an already measured duration to the current request."""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+def server_timing(timer):
+    """
+    Format a timer's spans as a Server-Timing header value
+
+    Args:
+        timer (RequestTimer): The finished request timer
+
+    Returns:
+        str: e.g. 'engine;dur=12.3, db_commit;dur=4.1;desc="3x", total;dur=20.5'
+    """
+    entries = []
+    for name, (seconds, count) in timer.snapshot().items():
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="{count}x"'
+        entries.append(entry)
+    if timer.duration is not None:
+        entries.append(f"total;dur={timer.duration * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,167 @@
+"""
+Migrations Module for the Fantasy RPG
+
+This module holds the schema upgrades applied at startup (new tables and
+new nullable columns on existing tables, with their indexes) and the one-shot data migrations exposed as
+Flask CLI commands.
+"""
+
+import base64
+import logging
+
+from sqlalchemy import inspect, text, or_
+
+import asset_store
+from models import CharacterAudio, SceneImage, InventoryItem, EquippedSlot, GameState
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Tables added after the first release
+ADDED_TABLES = [
+    SceneImage,
+    InventoryItem,
+    EquippedSlot
+]
+
+# Columns added after the first release: (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("character_audio", "audio_key", "VARCHAR(64)"),
+    ("game_state", "game_day", "INTEGER"),
+    ("game_state", "game_hour", "INTEGER"),
+    ("game_state", "gold", "INTEGER"),
+    ("game_state", "current_weight", "INTEGER"),
+    ("game_state", "max_weight", "INTEGER"),
+    ("game_state", "inventory_migrated", "BOOLEAN"),
+    ("equipped_slot", "stats", "TEXT")
+]
+
+# Run once, right after their column is added: (table, column) -> SQL
+COLUMN_BACKFILLS = {
+    # Inventories moved before the flag existed are recognised by their gold
+    ("game_state", "inventory_migrated"): "UPDATE game_state SET inventory_migrated = TRUE WHERE gold IS NOT NULL"
+}
+
+# Indexes on added columns: (index name, table, column)
+ADDED_INDEXES = [
+    ("ix_game_state_gold", "game_state", "gold")
+]
+
+def upgrade_schema(engine):
+    """
+    Add tables and columns introduced after the tables were first created
+
+    Args:
+        engine: The SQLAlchemy engine
+    """
+    for model in ADDED_TABLES:
+        model.__table__.create(engine, checkfirst=True)
+
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table, column, ddl_type in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = [c["name"] for c in inspector.get_columns(table)]
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+                logger.info(f"Added column {table}.{column}")
+                if (table, column) in COLUMN_BACKFILLS:
+                    conn.execute(text(COLUMN_BACKFILLS[(table, column)]))
+        for name, table, column in ADDED_INDEXES:
+            if table in existing_tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+
+def migrate_audio_row(audio):
+    """
+    Move one CharacterAudio row from base64 text to the audio store
+
+    Args:
+        audio (CharacterAudio): The row to migrate (the caller commits)
+
+    Returns:
+        bool: True if the row was migrated
+    """
+    if audio.audio_key or not audio.audio_data:
+        return False
+
+    audio_store = asset_store.get_audio_store()
+    audio_key = audio_store.key_for(audio.audio_text, audio.voice_type)
+    audio_store.put(audio_key, base64.b64decode(audio.audio_data))
+    audio.audio_key = audio_key
+    audio.audio_data = ""
+    return True
+
+def migrate_audio_to_store(session, batch_size=50):
+    """
+    Migrate every legacy CharacterAudio row to the audio store
+
+    Args:
+        session: The SQLAlchemy session
+        batch_size (int): Rows migrated per commit
+
+    Returns:
+        int: The number of rows migrated
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = session.query(CharacterAudio).filter(
+            CharacterAudio.id > last_id,
+            CharacterAudio.audio_key.is_(None),
+            CharacterAudio.audio_data != ""
+        ).order_by(CharacterAudio.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        for audio in rows:
+            last_id = audio.id
+            try:
+                if migrate_audio_row(audio):
+                    migrated += 1
+            except Exception as e:
+                # Leave unreadable rows untouched so they can be inspected
+                logger.error(f"Error migrating audio {audio.id}: {e}")
+        session.commit()
+
+    logger.info(f"Migrated {migrated} audio rows to the audio store")
+    return migrated
+
+def migrate_inventory_to_tables(session, batch_size=50):
+    """
+    Move every JSON inventory into the InventoryItem and EquippedSlot tables
+
+    Inventories are also moved one by one when first loaded (see
+    inventory_system.InventoryAccessor); this migrates the rest.
+
+    Args:
+        session: The SQLAlchemy session
+        batch_size (int): Rows migrated per commit
+
+    Returns:
+        int: The number of inventories migrated
+    """
+    import inventory_system
+
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = session.query(GameState).filter(
+            GameState.id > last_id,
+            or_(GameState.inventory_migrated.is_(None), GameState.inventory_migrated.is_(False))
+        ).order_by(GameState.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        for game_state in rows:
+            last_id = game_state.id
+            inventory = inventory_system.InventoryAccessor(game_state)
+            inventory.data  # Loading a JSON inventory schedules its move
+            if inventory.flush():
+                migrated += 1
+        session.commit()
+
+    logger.info(f"Migrated {migrated} inventories to the inventory tables")
+    return migrated
@@ -1,7 +1,7 @@
 import datetime
 from flask_login import UserMixin
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Integer, String, Text, DateTime, Boolean, ForeignKey, UniqueConstraint, Index
 
 class Base(DeclarativeBase):
     pass
@@ -47,8 +47,14 @@ class GameState(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     character_id: Mapped[int] = mapped_column(ForeignKey('character.id'))
     current_location: Mapped[str] = mapped_column(String(64), nullable=False)
-    inventory: Mapped[str] = mapped_column(Text, default="{}")  # JSON string of inventory items
+    inventory: Mapped[str] = mapped_column(Text, default="{}")  # Legacy JSON inventory, emptied once moved to the inventory tables
     quest_progress: Mapped[str] = mapped_column(Text, default="{}")  # JSON string of quest progress
+    game_day: Mapped[int] = mapped_column(Integer, nullable=True)  # Per-character world clock; None means day 1
+    game_hour: Mapped[int] = mapped_column(Integer, nullable=True)  # None means the starting hour
+    inventory_migrated: Mapped[bool] = mapped_column(Boolean, nullable=True)  # True once the inventory is in the inventory tables
+    gold: Mapped[int] = mapped_column(Integer, nullable=True, index=True)  # Set with inventory_migrated
+    current_weight: Mapped[int] = mapped_column(Integer, nullable=True)
+    max_weight: Mapped[int] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
     updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     character: Mapped["Character"] = relationship(back_populates="game_state")
@@ -74,10 +80,46 @@ class CharacterAudio(Base):
     character_id: Mapped[int] = mapped_column(ForeignKey('character.id'))
     audio_type: Mapped[str] = mapped_column(String(32), nullable=False, default='introduction')  # 'introduction', 'dialogue', etc.
     audio_text: Mapped[str] = mapped_column(Text, nullable=False)  # The text that was converted to speech
-    audio_data: Mapped[str] = mapped_column(Text, nullable=False)  # Base64-encoded audio data
+    audio_data: Mapped[str] = mapped_column(Text, nullable=False, default='')  # Legacy base64 audio, emptied by migrate-audio
+    audio_key: Mapped[str] = mapped_column(String(64), nullable=True)  # Key of the MP3 file in the audio store
     voice_type: Mapped[str] = mapped_column(String(32), nullable=False, default='onyx')  # The voice type used for the audio
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
     character: Mapped["Character"] = relationship(back_populates="audio_files")
     
     def __repr__(self):
         return f'<CharacterAudio {self.id} for Character {self.character_id} ({self.audio_type})>'
+
+class SceneImage(Base):
+    __tablename__ = 'scene_image'
+    __table_args__ = (UniqueConstraint('character_id', 'location', 'time_of_day'),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    character_id: Mapped[int] = mapped_column(ForeignKey('character.id'))
+    location: Mapped[str] = mapped_column(String(64), nullable=False)
+    time_of_day: Mapped[str] = mapped_column(String(16), nullable=False)
+    image_id: Mapped[int] = mapped_column(ForeignKey('game_image.id'))  # Last image shown of this scene
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SceneImage {self.location}/{self.time_of_day} for Character {self.character_id}>'
+
+class InventoryItem(Base):
+    __tablename__ = 'inventory_item'
+    __table_args__ = (Index('ix_inventory_item_item_id', 'item_id'),)
+    game_state_id: Mapped[int] = mapped_column(ForeignKey('game_state.id'), primary_key=True)
+    item_id: Mapped[str] = mapped_column(String(64), primary_key=True)  # Key of inventory_system.BASE_ITEMS
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    stats: Mapped[str] = mapped_column(Text, nullable=True)  # JSON of the stats that differ from the catalog
+    
+    def __repr__(self):
+        return f'<InventoryItem {self.item_id} x{self.quantity} for GameState {self.game_state_id}>'
+
+class EquippedSlot(Base):
+    __tablename__ = 'equipped_slot'
+    __table_args__ = (Index('ix_equipped_slot_item_id', 'item_id'),)
+    game_state_id: Mapped[int] = mapped_column(ForeignKey('game_state.id'), primary_key=True)
+    slot: Mapped[str] = mapped_column(String(16), primary_key=True)  # 'weapon', 'armor' or 'accessory'
+    item_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    stats: Mapped[str] = mapped_column(Text, nullable=True)  # JSON of the equipped instance's stat deltas
+    
+    def __repr__(self):
+        return f'<EquippedSlot {self.slot}={self.item_id} for GameState {self.game_state_id}>'
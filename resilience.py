@@ -0,0 +1,272 @@
+"""
+Resilience Module for the Fantasy RPG
+
+This module wraps an AI provider with the protections gunicorn workers
+need during provider incidents. Each endpoint type (chat, image, speech)
+gets three protections:
+
+- a token-bucket rate limiter;
+- a concurrency cap;
+- a circuit breaker that fails fast to the callers' placeholders while the
+  provider is unhealthy.
+
+Transient errors are retried with exponential backoff and jitter. Every
+wait is bounded, so a throttled provider cannot pile up workers.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+def _limits(endpoint, rate, burst, concurrency):
+    prefix = f"AI_{endpoint.upper()}"
+    return {
+        "rate": float(os.environ.get(f"{prefix}_RATE", rate)),  # Requests per second
+        "burst": float(os.environ.get(f"{prefix}_BURST", burst)),
+        "concurrency": int(os.environ.get(f"{prefix}_CONCURRENCY", concurrency))
+    }
+
+# Resilience configuration
+RESILIENCE_CONFIG = {
+    "endpoints": {
+        "chat": _limits("chat", rate=5, burst=10, concurrency=8),
+        "image": _limits("image", rate=1, burst=3, concurrency=3),
+        "speech": _limits("speech", rate=1, burst=2, concurrency=2)
+    },
+    "acquire_timeout": float(os.environ.get("AI_ACQUIRE_TIMEOUT", 5)),  # Max seconds waiting for a slot
+    "failure_threshold": int(os.environ.get("AI_BREAKER_FAILURES", 5)),
+    "reset_timeout": float(os.environ.get("AI_BREAKER_RESET", 30)),  # Seconds open before a trial call
+    "max_retries": int(os.environ.get("AI_MAX_RETRIES", 2)),
+    "backoff_base": 0.5,
+    "backoff_max": 8.0
+}
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling the provider when it is throttled or unhealthy."""
+
+class TokenBucket:
+    """Token-bucket rate limiter."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout):
+        """
+        Take one token, waiting up to timeout seconds for it
+
+        Returns:
+            bool: True if a token was taken
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Drain the bucket after the provider asks us to slow down."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial -> closed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go to the provider now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                # Only one trial call at a time while half-open
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def release_trial(self):
+        """Give back a half-open trial that never reached the provider."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker closed: provider recovered")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+def _status_code(error):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+def is_retryable(error):
+    """Throttling, timeouts, connection errors and 5xx responses are worth retrying."""
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in (
+        "APITimeoutError", "APIConnectionError", "RateLimitError"
+    )
+
+class _EndpointGuard:
+    """Rate limiter, concurrency cap and circuit breaker for one endpoint type."""
+
+    def __init__(self, name, limits):
+        self.name = name
+        self.bucket = TokenBucket(limits["rate"], limits["burst"])
+        self.slots = threading.BoundedSemaphore(limits["concurrency"])
+        self.concurrency = limits["concurrency"]
+        self.breaker = CircuitBreaker(RESILIENCE_CONFIG["failure_threshold"], RESILIENCE_CONFIG["reset_timeout"])
+        self.in_flight = 0
+        self.counters = {"calls": 0, "failures": 0, "retries": 0, "rejected": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def call(self, func, *args, **kwargs):
+        """Run a provider call under this endpoint's protections."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise ProviderUnavailable(f"{self.name} circuit is open")
+            if not self.bucket.acquire(RESILIENCE_CONFIG["acquire_timeout"]):
+                self.breaker.release_trial()
+                self._count("rejected")
+                raise ProviderUnavailable(f"{self.name} rate limit reached")
+            if not self.slots.acquire(timeout=RESILIENCE_CONFIG["acquire_timeout"]):
+                self.breaker.release_trial()
+                self._count("rejected")
+                raise ProviderUnavailable(f"{self.name} concurrency limit reached")
+
+            with self._lock:
+                self.in_flight += 1
+                self.counters["calls"] += 1
+            try:
+                result = func(*args, **kwargs)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                self._count("failures")
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                    if _status_code(e) == 429:
+                        self.bucket.penalize(self._backoff(attempt))
+                else:
+                    # The provider answered; the request itself was bad
+                    self.breaker.record_success()
+                if not retryable or attempt >= RESILIENCE_CONFIG["max_retries"]:
+                    raise
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self.slots.release()
+
+            delay = self._backoff(attempt)
+            attempt += 1
+            self._count("retries")
+            logger.warning(f"Retrying {self.name} call in {delay:.2f}s (attempt {attempt})")
+            time.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt):
+        # Exponential backoff with full jitter
+        ceiling = min(RESILIENCE_CONFIG["backoff_max"], RESILIENCE_CONFIG["backoff_base"] * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def snapshot(self):
+        with self._lock:
+            state = dict(self.counters)
+            state["in_flight"] = self.in_flight
+        state["concurrency_limit"] = self.concurrency
+        state["tokens_available"] = round(max(self.bucket.tokens, 0.0), 2)
+        state.update(self.breaker.snapshot())
+        return state
+
+class ResilientProvider:
+    """Provider wrapper adding rate limits, concurrency caps and circuit breakers."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.guards = {
+            name: _EndpointGuard(name, limits)
+            for name, limits in RESILIENCE_CONFIG["endpoints"].items()
+        }
+
+    def complete(self, messages, model, temperature, max_tokens=None):
+        return self.guards["chat"].call(self.provider.complete, messages, model, temperature, max_tokens)
+
+    def stream(self, messages, model, temperature, max_tokens=None):
+        # Only opening the stream is guarded; chunks then flow without holding a slot
+        return self.guards["chat"].call(self.provider.stream, messages, model, temperature, max_tokens)
+
+    def generate_image(self, prompt, model, size):
+        return self.guards["image"].call(self.provider.generate_image, prompt, model, size)
+
+    def synthesize_speech(self, text, voice):
+        return self.guards["speech"].call(self.provider.synthesize_speech, text, voice)
+
+    def state(self):
+        """
+        Get the limiter and breaker state of every endpoint
+
+        Returns:
+            dict: Per-endpoint counters, in-flight calls and breaker state
+        """
+        return {name: guard.snapshot() for name, guard in self.guards.items()}
@@ -0,0 +1,248 @@
+"""
+Response Cache Module for the Fantasy RPG
+
+This module caches text completions keyed on the normalized prompt, system
+message, model and temperature. Lookups go through an in-memory LRU tier
+first and then through a SQLite tier shared by all workers. Both tiers
+honour a TTL and a maximum size, and hit/miss counters record how much
+latency and how many tokens the cache saved.
+"""
+
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_CONFIG = {
+    "enabled": os.environ.get("AI_CACHE_ENABLED", "1") == "1",
+    "ttl_seconds": int(os.environ.get("AI_CACHE_TTL", 24 * 3600)),
+    "memory_entries": int(os.environ.get("AI_CACHE_MEMORY_ENTRIES", 512)),
+    "disk_entries": int(os.environ.get("AI_CACHE_DISK_ENTRIES", 20000)),
+    "prune_every": 100  # Disk writes between two eviction passes
+}
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    latency REAL NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+"""
+
+def normalize_prompt(text):
+    """
+    Normalize a prompt so formatting differences do not defeat the cache
+
+    Args:
+        text (str): The prompt text
+
+    Returns:
+        str: The prompt in NFC form with collapsed whitespace
+    """
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def make_key(prompt, system_message, model, temperature):
+    """
+    Build the cache key for a completion request
+
+    Args:
+        prompt (str): The user prompt
+        system_message (str): The system message
+        model (str): The model name
+        temperature (float): The sampling temperature
+
+    Returns:
+        str: A SHA-256 hex digest identifying the request
+    """
+    payload = json.dumps(
+        [normalize_prompt(prompt), normalize_prompt(system_message), model, round(float(temperature), 3)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class NullCache:
+    """Cache that never stores anything; used when caching is disabled."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, latency=0.0, tokens=0):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"enabled": False}
+
+class ResponseCache:
+    """Two-tier LRU+TTL cache: per-process memory in front of a shared SQLite file."""
+
+    def __init__(self, ttl_seconds, memory_entries, disk_entries, database=None):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.database = database or LocalDatabase("ai_cache.db", CACHE_SCHEMA)
+        self._memory = OrderedDict()  # key -> (value, created_at, latency, tokens)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "saved_seconds": 0.0,
+            "saved_tokens": 0
+        }
+
+    def _remember(self, key, entry):
+        # Caller holds the lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, tier, latency, tokens):
+        # Caller holds the lock
+        self._counters[tier] += 1
+        self._counters["saved_seconds"] += latency
+        self._counters["saved_tokens"] += tokens
+
+    def get(self, key):
+        """
+        Look up a cached response
+
+        Args:
+            key (str): The cache key from make_key
+
+        Returns:
+            str: The cached response, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self._record_hit("memory_hits", entry[2], entry[3])
+                return entry[0]
+            if entry:
+                del self._memory[key]
+
+        try:
+            row = self.database.execute(
+                "SELECT value, created_at, latency, tokens FROM responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row:
+                self.database.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        except Exception as e:
+            logger.error(f"Error reading response cache: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self._remember(key, row)
+                self._record_hit("disk_hits", row[2], row[3])
+                return row[0]
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key, value, latency=0.0, tokens=0):
+        """
+        Store a response in both tiers
+
+        Args:
+            key (str): The cache key from make_key
+            value (str): The generated response
+            latency (float): Seconds the provider took, credited on every hit
+            tokens (int): Tokens the provider billed, credited on every hit
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, (value, now, latency, tokens))
+            self._writes += 1
+            prune = self._writes % CACHE_CONFIG["prune_every"] == 0
+
+        try:
+            self.database.execute(
+                "INSERT OR REPLACE INTO responses (key, value, latency, tokens, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, latency, tokens, now, now)
+            )
+            if prune:
+                self.prune()
+        except Exception as e:
+            logger.error(f"Error writing response cache: {e}")
+
+    def prune(self):
+        """Drop expired rows, then the least recently used rows over the size limit."""
+        now = time.time()
+        self.database.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+        self.database.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,)
+        )
+
+    def clear(self):
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        self.database.execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        Get the cache counters for this worker
+
+        Returns:
+            dict: Hit/miss counters, hit ratio and the latency/tokens saved
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["enabled"] = True
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        return stats
+
+_cache = None
+
+def get_cache():
+    """Return the process-wide response cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        if CACHE_CONFIG["enabled"]:
+            _cache = ResponseCache(
+                ttl_seconds=CACHE_CONFIG["ttl_seconds"],
+                memory_entries=CACHE_CONFIG["memory_entries"],
+                disk_entries=CACHE_CONFIG["disk_entries"]
+            )
+        else:
+            _cache = NullCache()
+    return _cache
+
+def set_cache(cache):
+    """
+    Replace the process-wide response cache
+
+    Args:
+        cache: Any object implementing get, set, clear and stats
+    """
+    global _cache
+    _cache = cache
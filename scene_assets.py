@@ -0,0 +1,249 @@
+"""
+Scene Assets Module for the Fantasy RPG
+
+This module pre-renders the assets that depend only on the static world
+data: the base description and the image of every location at each time
+of day. `flask warm-scenes` (or SCENE_WARMUP_ON_START) renders them into
+the asset store and records them in a SQLite index shared by all workers;
+each worker keeps the index in a dict, so the game engine resolves a
+scene with a dict lookup. While scenes are missing the dict is reloaded
+from the index, less often each time a reload finds nothing new. Scenes whose image could not be generated or
+stored are recorded as failed and retried on later passes; until then
+they are generated on demand like any other scene. /ready reports
+warm-up progress and answers 200 once every scene has been attempted,
+or at once when warm-up on start is disabled.
+
+Scene images are shared by every player, so their prompts leave out the
+character description that on-demand location images include.
+"""
+
+import os
+import time
+import logging
+import threading
+
+import asset_store
+import game_world
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+TIMES_OF_DAY = ["morning", "afternoon", "evening", "night"]
+
+# Warm-up configuration
+SCENE_CONFIG = {
+    "warmup_on_start": os.environ.get("SCENE_WARMUP_ON_START", "0") == "1",
+    "refresh_interval": 5.0,  # Seconds between index reloads while scenes are missing
+    "max_refresh_interval": 300.0,  # Reloads that find nothing new back off up to this
+    "retry_interval": float(os.environ.get("SCENE_RETRY_INTERVAL", 300))  # Seconds between passes over failed scenes (0: no retry)
+}
+
+SCENE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scene_assets (
+    location TEXT NOT NULL,
+    time_of_day TEXT NOT NULL,
+    description TEXT NOT NULL,
+    image_url TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (location, time_of_day)
+);
+CREATE TABLE IF NOT EXISTS scene_failures (
+    location TEXT NOT NULL,
+    time_of_day TEXT NOT NULL,
+    attempted_at REAL NOT NULL,
+    PRIMARY KEY (location, time_of_day)
+);
+"""
+
+class SceneAssets:
+    """Pre-rendered (location, time_of_day) descriptions and images."""
+
+    def __init__(self, database=None):
+        self.database = database or LocalDatabase("scene_assets.db", SCENE_SCHEMA)
+        self._scenes = {}
+        self._failed = set()  # Attempted but not rendered
+        self._refresh_interval = SCENE_CONFIG["refresh_interval"]
+        self._next_refresh = 0.0
+        self._warming = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def all_scenes():
+        """Return every (location, time_of_day) pair of the world."""
+        return [(location, time_of_day) for location in game_world.LOCATIONS for time_of_day in TIMES_OF_DAY]
+
+    def load(self):
+        """Reload the rendered scenes from the shared index."""
+        rows = self.database.execute(
+            "SELECT location, time_of_day, description, image_url FROM scene_assets"
+        ).fetchall()
+        scenes = {
+            (row[0], row[1]): {"description": row[2], "image_url": row[3]}
+            for row in rows
+        }
+        failed = {
+            (row[0], row[1])
+            for row in self.database.execute("SELECT location, time_of_day FROM scene_failures")
+        }
+        failed -= scenes.keys()
+        with self._lock:
+            if scenes != self._scenes or failed != self._failed:
+                self._refresh_interval = SCENE_CONFIG["refresh_interval"]
+            else:
+                self._refresh_interval = min(self._refresh_interval * 2, SCENE_CONFIG["max_refresh_interval"])
+            self._scenes = scenes
+            self._failed = failed
+            self._next_refresh = time.monotonic() + self._refresh_interval
+
+    def _refresh_if_stale(self):
+        # Scenes rendered by another process appear after the next reload
+        if len(self._scenes) >= len(self.all_scenes()):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_refresh:
+                return
+            # Claim this reload so concurrent requests skip it
+            self._next_refresh = now + self._refresh_interval
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Error loading scene assets: {e}")
+
+    def get(self, location, time_of_day):
+        """
+        Get a pre-rendered scene
+
+        Args:
+            location (str): The location ID
+            time_of_day (str): 'morning', 'afternoon', 'evening', or 'night'
+
+        Returns:
+            dict: description and image_url, or None if the scene is not rendered
+        """
+        self._refresh_if_stale()
+        return self._scenes.get((location, time_of_day))
+
+    def describe(self, location, time_of_day):
+        """Return the base description of a location, rendered or not."""
+        scene = self.get(location, time_of_day)
+        if scene:
+            return scene["description"]
+        return game_world.get_location_description(location, time_of_day)
+
+    def warm(self, progress=None):
+        """
+        Render every missing scene, including those that failed before
+
+        A scene counts as rendered only when its image was stored locally;
+        a placeholder or a provider URL (the download failed, and provider
+        URLs expire) records the scene as failed instead.
+
+        Args:
+            progress: Optional callable taking (done, total, location, time_of_day)
+
+        Returns:
+            int: The number of scenes rendered
+        """
+        from ai_service import generate_image
+
+        self.load()
+        scenes = self.all_scenes()
+        rendered = 0
+        with self._lock:
+            self._warming = True
+        try:
+            for done, (location, time_of_day) in enumerate(scenes, 1):
+                if (location, time_of_day) not in self._scenes:
+                    description = game_world.get_location_description(location, time_of_day)
+                    image_url = generate_image(
+                        game_world.get_location_image_prompt(location, time_of_day),
+                        wait_for_store=True
+                    )
+                    if image_url and image_url.startswith(asset_store.IMAGE_URL_PREFIX):
+                        self._store(location, time_of_day, description, image_url)
+                        rendered += 1
+                    else:
+                        logger.warning(f"Scene {location} ({time_of_day}) not rendered; will retry")
+                        self._record_failure(location, time_of_day)
+                if progress:
+                    progress(done, len(scenes), location, time_of_day)
+        finally:
+            with self._lock:
+                self._warming = False
+        return rendered
+
+    def _store(self, location, time_of_day, description, image_url):
+        with self.database.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scene_assets (location, time_of_day, description, image_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (location, time_of_day, description, image_url, time.time())
+            )
+            conn.execute(
+                "DELETE FROM scene_failures WHERE location = ? AND time_of_day = ?",
+                (location, time_of_day)
+            )
+        with self._lock:
+            self._scenes[(location, time_of_day)] = {"description": description, "image_url": image_url}
+            self._failed.discard((location, time_of_day))
+
+    def _record_failure(self, location, time_of_day):
+        self.database.execute(
+            "INSERT OR REPLACE INTO scene_failures (location, time_of_day, attempted_at) VALUES (?, ?, ?)",
+            (location, time_of_day, time.time())
+        )
+        with self._lock:
+            self._failed.add((location, time_of_day))
+
+    def _warm_until_rendered(self):
+        try:
+            self.warm()
+            while self._failed and SCENE_CONFIG["retry_interval"] > 0:
+                time.sleep(SCENE_CONFIG["retry_interval"])
+                self.warm()
+        except Exception as e:
+            logger.error(f"Error warming scene assets: {e}")
+
+    def start_warmup(self):
+        """Render the missing scenes in a background thread, retrying failures."""
+        threading.Thread(target=self._warm_until_rendered, name="scene-warmup", daemon=True).start()
+
+    def readiness(self):
+        """
+        Report warm-up progress
+
+        Ready once every scene was attempted (rendered or failed), or
+        always when warm-up on start is disabled: missing scenes are then
+        generated on demand.
+
+        Returns:
+            dict: ready, rendered, failed, total, progress (0-1) and warming
+        """
+        self._refresh_if_stale()
+        total = len(self.all_scenes())
+        rendered = len(self._scenes)
+        failed = len(self._failed)
+        return {
+            "ready": not SCENE_CONFIG["warmup_on_start"] or rendered + failed >= total,
+            "rendered": rendered,
+            "failed": failed,
+            "total": total,
+            "progress": round(rendered / total, 3) if total else 1.0,
+            "warming": self._warming
+        }
+
+_scene_assets = None
+
+def get_scene_assets():
+    """Return the process-wide scene assets, loading the index on first use."""
+    global _scene_assets
+    if _scene_assets is None:
+        _scene_assets = SceneAssets()
+        try:
+            _scene_assets.load()
+        except Exception as e:
+            logger.error(f"Error loading scene assets: {e}")
+    return _scene_assets
@@ -0,0 +1,196 @@
+"""
+Single-Flight Module for the Fantasy RPG
+
+This module coalesces identical in-flight AI requests. Within a worker,
+concurrent callers with the same key wait on the first caller's call and
+share its result. Across workers, a lock table in a shared SQLite file
+elects one leader per key; the other workers poll for the result it
+publishes instead of paying for the same provider request. Followers
+wait no longer than the caller's deadline and then take its fallback, so
+a stuck leader cannot hold every request with the same key.
+"""
+
+import os
+import time
+import json
+import logging
+import threading
+
+from local_store import LocalDatabase
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Single-flight configuration
+SINGLEFLIGHT_CONFIG = {
+    "cross_worker": os.environ.get("AI_SINGLEFLIGHT_CROSS_WORKER", "1") == "1",
+    "lock_ttl": float(os.environ.get("AI_SINGLEFLIGHT_LOCK_TTL", 120)),  # Seconds before a leader's lock is considered dead
+    "poll_interval": 0.1,
+    "result_ttl": 60  # Seconds a published result stays available to followers
+}
+
+FLIGHT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flight_locks (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flight_results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+class _Call:
+    """An in-flight call that local followers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result."""
+
+    def __init__(self, namespace, database=None, cross_worker=None):
+        """
+        Args:
+            namespace (str): Prefix separating the keys of different call types
+            database (LocalDatabase, optional): The shared lock table
+            cross_worker (bool, optional): Coordinate with other workers too
+        """
+        self.namespace = namespace
+        self.cross_worker = SINGLEFLIGHT_CONFIG["cross_worker"] if cross_worker is None else cross_worker
+        self.database = database or LocalDatabase("singleflight.db", FLIGHT_SCHEMA)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None, fallback=None):
+        """
+        Run func once for all concurrent callers with the same key
+
+        Args:
+            key (str): Identifies identical requests (e.g. a prompt hash)
+            func: Zero-argument callable returning a JSON-serializable result
+            timeout (float, optional): Seconds to wait for another caller's
+                result; None waits as long as the leader runs
+            fallback: Returned when the timeout expires first
+
+        Returns:
+            The result of func, computed by this caller or shared by the
+            leader, or fallback when waiting for the leader timed out
+
+        Raises:
+            Exception: Whatever func raised in this worker's leader call
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                logger.warning(f"Timed out waiting for in-flight {self.namespace} call; using the fallback")
+                return fallback
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_leader(key, func, deadline, fallback) if self.cross_worker else func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_leader(self, key, func, deadline=None, fallback=None):
+        flight_key = f"{self.namespace}:{key}"
+        waiting_since = time.time()
+
+        while True:
+            if self._acquire(flight_key):
+                break
+
+            # Another worker is running the same request; wait for its result
+            result = self._published_result(flight_key, waiting_since)
+            if result is not None:
+                return result
+            if self._lock_released(flight_key):
+                # The leader may have published just before releasing
+                result = self._published_result(flight_key, waiting_since)
+                if result is not None:
+                    return result
+                # Otherwise it failed without publishing; try to lead the call here
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for {flight_key} in another worker; using the fallback")
+                return fallback
+            time.sleep(SINGLEFLIGHT_CONFIG["poll_interval"])
+
+        try:
+            result = func()
+            self._publish(flight_key, result)
+            return result
+        finally:
+            self._release(flight_key)
+
+    @property
+    def _owner(self):
+        # Read on every use: gunicorn may fork workers after this object exists
+        return str(os.getpid())
+
+    def _acquire(self, flight_key):
+        try:
+            now = time.time()
+            with self.database.transaction() as conn:
+                conn.execute("DELETE FROM flight_locks WHERE key = ? AND expires_at < ?", (flight_key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO flight_locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (flight_key, self._owner, now + SINGLEFLIGHT_CONFIG["lock_ttl"])
+                )
+                return cursor.rowcount == 1
+        except Exception as e:
+            # Never let the lock table block generation
+            logger.error(f"Error acquiring single-flight lock: {e}")
+            return True
+
+    def _release(self, flight_key):
+        try:
+            self.database.execute(
+                "DELETE FROM flight_locks WHERE key = ? AND owner = ?", (flight_key, self._owner)
+            )
+        except Exception as e:
+            logger.error(f"Error releasing single-flight lock: {e}")
+
+    def _lock_released(self, flight_key):
+        row = self.database.execute(
+            "SELECT 1 FROM flight_locks WHERE key = ? AND expires_at >= ?", (flight_key, time.time())
+        ).fetchone()
+        return row is None
+
+    def _publish(self, flight_key, result):
+        try:
+            now = time.time()
+            self.database.execute(
+                "INSERT OR REPLACE INTO flight_results (key, value, created_at) VALUES (?, ?, ?)",
+                (flight_key, json.dumps(result), now)
+            )
+            self.database.execute(
+                "DELETE FROM flight_results WHERE created_at < ?", (now - SINGLEFLIGHT_CONFIG["result_ttl"],)
+            )
+        except Exception as e:
+            logger.error(f"Error publishing single-flight result: {e}")
+
+    def _published_result(self, flight_key, since):
+        row = self.database.execute(
+            "SELECT value FROM flight_results WHERE key = ? AND created_at >= ?", (flight_key, since)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
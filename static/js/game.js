@@ -43,6 +43,95 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Function to send command to server
     function sendCommand(command) {
+        // Narração progressiva quando o navegador suporta leitura de streams
+        if (window.ReadableStream && window.TextDecoder) {
+            streamCommand(command);
+        } else {
+            sendCommandJson(command);
+        }
+    }
+    
+    // Envia o comando e renderiza os eventos SSE à medida que chegam
+    function streamCommand(command) {
+        const formData = new FormData();
+        formData.append('command', command);
+        
+        let paragraph = null;
+        let narration = '';
+        
+        const handleEvent = (event, data) => {
+            if (event === 'narration') {
+                if (!paragraph) {
+                    paragraph = appendToGameText('', 'game-response');
+                }
+                narration += data.text;
+                paragraph.textContent = narration;
+                gameText.scrollTop = gameText.scrollHeight;
+            } else if (event === 'replace' && paragraph) {
+                // Texto final filtrado pela moderação
+                narration = data.text;
+                paragraph.textContent = narration;
+            } else if (event === 'hint' && data.hint) {
+                showContextualHint(data.hint);
+            } else if (event === 'image') {
+                loadingOverlay.classList.add('d-none');
+                gameImage.src = data.image_url;
+            } else if (event === 'image_job') {
+                // A imagem ainda está sendo gerada em segundo plano
+                pollImageJob(data.job_id);
+            } else if (event === 'done') {
+                loadingOverlay.classList.add('d-none');
+                // Atualizar a música de fundo se a localização mudou
+                if (data.current_location && window.audioManager) {
+                    window.audioManager.playLocationMusic(data.current_location);
+                    gameState.currentLocation = data.current_location;
+                }
+            }
+        };
+        
+        fetch('/command/stream', {
+            method: 'POST',
+            body: formData
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error('Resposta da rede não foi ok');
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            const read = () => reader.read().then(({done, value}) => {
+                if (done) return;
+                buffer += decoder.decode(value, {stream: true});
+                
+                // Eventos SSE são separados por uma linha em branco
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    
+                    let event = 'message';
+                    let data = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    if (data) handleEvent(event, JSON.parse(data));
+                }
+                return read();
+            });
+            return read();
+        })
+        .catch(error => {
+            console.error('Erro:', error);
+            loadingOverlay.classList.add('d-none');
+            appendToGameText('Erro ao processar seu comando. Por favor, tente novamente.', 'error-message');
+        });
+    }
+    
+    // Envia o comando e aguarda a resposta JSON completa
+    function sendCommandJson(command) {
         const formData = new FormData();
         formData.append('command', command);
         
@@ -63,8 +152,11 @@ document.addEventListener('DOMContentLoaded', function() {
             // Update game text with response
             appendToGameText(data.description, 'game-response');
             
-            // Update game image
+            // Mostra a imagem anterior enquanto a nova é gerada em segundo plano
             gameImage.src = data.image_url;
+            if (data.image_job_id) {
+                pollImageJob(data.image_job_id);
+            }
             
             // Auto-scroll to bottom of game text
             gameText.scrollTop = gameText.scrollHeight;
@@ -88,6 +180,31 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Consulta o job de imagem até que a nova cena fique pronta
+    let imageJobTimer = null;
+    function pollImageJob(jobId, attempt = 0) {
+        clearTimeout(imageJobTimer);
+        if (attempt >= 60) return;
+        
+        imageJobTimer = setTimeout(() => {
+            fetch(`/image_job/${jobId}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Resposta da rede não foi ok');
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (data.image_url) {
+                    gameImage.src = data.image_url;
+                } else {
+                    pollImageJob(jobId, attempt + 1);
+                }
+            })
+            .catch(error => console.error('Erro ao consultar imagem:', error));
+        }, attempt === 0 ? 500 : 1500);
+    }
+    
     // Function to append text to game output
     function appendToGameText(text, className) {
         const paragraph = document.createElement('p');
@@ -98,6 +215,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Auto-scroll to bottom
         gameText.scrollTop = gameText.scrollHeight;
+        return paragraph;
     }
     
     // Image error handling
@@ -195,16 +313,11 @@ document.addEventListener('DOMContentLoaded', function() {
                     return response.json();
                 })
                 .then(data => {
-                    // Converter dados de áudio base64 para blob
-                    const audioData = data.audio_data;
+                    // O servidor envia apenas os metadados; o MP3 é transmitido pela URL
                     const audioText = data.audio_text;
                     
-                    // Criar URL do blob para o áudio
-                    const audioBlob = base64ToBlob(audioData, 'audio/mpeg');
-                    const audioUrl = URL.createObjectURL(audioBlob);
-                    
                     // Configurar o player de áudio
-                    audioIntroPlayer.src = audioUrl;
+                    audioIntroPlayer.src = data.audio_url;
                     audioIntroText.textContent = audioText;
                     
                     // Mostrar o container de áudio
@@ -227,24 +340,4 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
         });
     }
-    
-    // Função para converter base64 para blob
-    function base64ToBlob(base64, mimeType) {
-        const byteCharacters = atob(base64);
-        const byteArrays = [];
-        
-        for (let offset = 0; offset < byteCharacters.length; offset += 512) {
-            const slice = byteCharacters.slice(offset, offset + 512);
-            
-            const byteNumbers = new Array(slice.length);
-            for (let i = 0; i < slice.length; i++) {
-                byteNumbers[i] = slice.charCodeAt(i);
-            }
-            
-            const byteArray = new Uint8Array(byteNumbers);
-            byteArrays.push(byteArray);
-        }
-        
-        return new Blob(byteArrays, {type: mimeType});
-    }
 });
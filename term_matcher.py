@@ -0,0 +1,178 @@
+"""
+Term Matcher Module for the Fantasy RPG
+
+This module finds every occurrence of a list of terms in a text in one
+pass, with an Aho-Corasick automaton. Each term carries a label (e.g. its
+severity); the automaton is built once per term list and then scans a
+text in time linear in its length, however many terms there are.
+Matching is case-insensitive and, like the substring tests it replaces,
+not limited to whole words. A Scanner keeps the automaton state between
+calls, so text arriving in pieces (a streamed LLM response) is matched
+as if it were one string.
+"""
+
+class Match:
+    """One occurrence of a term: text[start:end] matched `term` with `label`."""
+
+    __slots__ = ("start", "end", "term", "label")
+
+    def __init__(self, start, end, term, label):
+        self.start = start
+        self.end = end
+        self.term = term
+        self.label = label
+
+    def __repr__(self):
+        return f"<Match {self.term!r} ({self.label}) at {self.start}:{self.end}>"
+
+def _lower(text):
+    # Lowercase without shifting positions (a few characters grow when lowered)
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+class Scanner:
+    """Incremental find(): feeds pieces of one text through a TermMatcher."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.state = 0
+        self.position = 0  # Characters fed so far
+
+    @property
+    def pending(self):
+        """
+        How many of the last characters fed may begin a match that is not
+        complete yet; every later match starts at or after
+        position - pending.
+        """
+        return self.matcher._depth[self.state]
+
+    def feed(self, text):
+        """
+        Scan the next piece of the text
+
+        Args:
+            text (str): The piece
+
+        Returns:
+            list: Matches ending in this piece, with positions counted from
+                the start of the whole text
+        """
+        matches = []
+        if not self.matcher or not text:
+            self.position += len(text or "")
+            return matches
+        goto, fail, output = self.matcher._goto, self.matcher._fail, self.matcher._output
+        state = self.state
+        offset = self.position + 1
+        for index, character in enumerate(_lower(text)):
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            for term, label in output[state]:
+                matches.append(Match(offset + index - len(term), offset + index, term, label))
+        self.state = state
+        self.position += len(text)
+        return matches
+
+class TermMatcher:
+    """Aho-Corasick automaton over labelled terms."""
+
+    def __init__(self, terms):
+        """
+        Build the automaton
+
+        Args:
+            terms: Iterable of (term, label) pairs; empty terms are ignored
+        """
+        self._goto = [{}]  # State -> {character: next state}
+        self._fail = [0]
+        self._output = [()]  # State -> ((term, label), ...) ending here
+        self._depth = [0]  # State -> length of the term prefix it stands for
+        self.longest = 0
+
+        for term, label in terms:
+            key = _lower(term.strip())
+            if not key:
+                continue
+            state = 0
+            for character in key:
+                next_state = self._goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][character] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._depth.append(self._depth[state] + 1)
+                state = next_state
+            if (key, label) not in self._output[state]:
+                self._output[state] += ((key, label),)
+            self.longest = max(self.longest, len(key))
+
+        # Breadth-first failure links; each state also reports the terms of its fallback
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for character, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and character not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(character, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def __bool__(self):
+        return self.longest > 0
+
+    def find(self, text):
+        """
+        Find every occurrence of every term
+
+        Args:
+            text (str): The text to scan
+
+        Returns:
+            list: Match objects, in the order their ends appear in the text
+        """
+        return Scanner(self).feed(text)
+
+    def scanner(self):
+        """Return a Scanner for text that arrives in pieces."""
+        return Scanner(self)
+
+    @staticmethod
+    def replace(text, matches, replacements):
+        """
+        Rewrite matched spans
+
+        Overlapping matches are resolved leftmost-longest, so each part of
+        the text is replaced at most once.
+
+        Args:
+            text (str): The scanned text
+            matches (list): Matches found in it by find()
+            replacements (dict): Label -> replacement text; matches with
+                other labels are left alone
+
+        Returns:
+            str: The rewritten text
+        """
+        selected = sorted(
+            (m for m in matches if m.label in replacements),
+            key=lambda m: (m.start, -m.end)
+        )
+        if not selected:
+            return text
+        parts = []
+        cursor = 0
+        for match in selected:
+            if match.start < cursor:
+                continue
+            parts.append(text[cursor:match.start])
+            parts.append(replacements[match.label])
+            cursor = match.end
+        parts.append(text[cursor:])
+        return "".join(parts)
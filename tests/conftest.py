@@ -0,0 +1,33 @@
+"""Shared test setup: import the app modules from the repository root and
+keep every local store, asset and model file in a throwaway directory."""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Read at import time by the modules under test, so set before they load
+_STORE_DIR = tempfile.mkdtemp(prefix="rpg-tests-")
+os.environ.setdefault("LOCAL_STORE_DIR", os.path.join(_STORE_DIR, "local"))
+os.environ.setdefault("ASSET_STORE_DIR", os.path.join(_STORE_DIR, "assets"))
+os.environ.setdefault("AI_PROVIDER", "stub")
+os.environ.setdefault("TOXICITY_MODEL_PATH", os.path.join(_STORE_DIR, "no-model.bin"))
+
+@pytest.fixture
+def filter_terms_store(tmp_path, monkeypatch):
+    """A fresh, empty term store, with filtering_toxicity's matchers rebuilt from it."""
+    import filter_terms
+    import filtering_toxicity
+    from local_store import LocalDatabase
+
+    database = LocalDatabase("filter_terms.db", filter_terms.TERMS_SCHEMA)
+    database.path = str(tmp_path / "filter_terms.db")
+    store = filter_terms.FilterTermStore(database)
+    monkeypatch.setattr(filter_terms, "_store", store)
+    monkeypatch.setattr(filtering_toxicity, "_matchers", (None, None, None))
+    filtering_toxicity.load_filter_terms()
+    return store
@@ -0,0 +1,43 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ai_pipeline
+
+@pytest.fixture
+def single_worker(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(ai_pipeline, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+def test_results_and_fallbacks(single_worker):
+    def fail():
+        raise RuntimeError("provider down")
+    results = ai_pipeline.run_parallel({"text": (lambda: "ok", "fallback"), "image": (fail, "placeholder")}, deadline=1)
+    assert results == {"text": "ok", "image": "placeholder"}
+
+def test_slow_call_falls_back(single_worker):
+    release = threading.Event()
+    results = ai_pipeline.run_parallel({"text": (lambda: release.wait(2) and "late", "fallback")}, deadline=0.1)
+    release.set()
+    assert results == {"text": "fallback"}
+
+def test_queue_time_does_not_count_against_the_deadline(single_worker):
+    # The only thread is busy for 0.2s; the call then runs 0.15s, within its
+    # 0.25s deadline though 0.35s after it was submitted
+    single_worker.submit(time.sleep, 0.2)
+    started = time.monotonic()
+    results = ai_pipeline.run_parallel({"text": (lambda: time.sleep(0.15) or "ok", "fallback")}, deadline=0.25)
+    assert results == {"text": "ok"}
+    assert time.monotonic() - started >= 0.35
+
+def test_call_queued_for_a_whole_deadline_never_runs(single_worker):
+    ran = []
+    single_worker.submit(time.sleep, 0.5)
+    results = ai_pipeline.run_parallel({"text": (lambda: ran.append(True) or "ok", "fallback")}, deadline=0.1)
+    single_worker.shutdown(wait=True)
+    assert results == {"text": "fallback"}
+    assert ran == []
@@ -0,0 +1,69 @@
+import pytest
+
+import command_router
+from command_router import CommandRouter
+
+@pytest.fixture
+def router():
+    from game_engine import COMMAND_VERBS
+    router = CommandRouter()
+    for name, aliases, mode in COMMAND_VERBS:
+        router.register(name, aliases, mode)
+    return router
+
+@pytest.mark.parametrize("command,expected", [
+    ("ir para floresta sombria", ("move", "floresta sombria")),
+    ("viajar para vila", ("move", "vila")),
+    ("ir a taverna", ("move", "taverna")),
+    ("falar com ferreiro gorim", ("talk", "ferreiro gorim")),
+    ("perguntar a guarda", ("talk", "guarda")),
+    ("equipar espada longa", ("equip", "espada longa")),
+    ("beber poção de cura", ("use", "poção de cura")),
+])
+def test_multi_word_aliases_take_the_argument(router, command, expected):
+    assert router.resolve(command) == expected
+
+@pytest.mark.parametrize("command,expected", [
+    ("status", ("status", "")),
+    ("inventário", ("inventory", "")),
+    ("mochila", ("inventory", "")),
+    ("ajuda", ("help", "")),
+    ("descansar", ("rest", "")),
+])
+def test_single_word_commands(router, command, expected):
+    assert router.resolve(command) == expected
+
+def test_optional_argument(router):
+    assert router.resolve("olhar") == ("look", "")
+    assert router.resolve("olhar ao redor") == ("look", "ao redor")
+    assert router.resolve("ver") == ("look", "")
+
+@pytest.mark.parametrize("command", [
+    "status do grupo",  # EXACT aliases take no argument
+    "ver o mapa",
+    "equipar",  # ARGUMENT aliases need one
+    "ir para",
+    "usar",
+])
+def test_alias_in_the_wrong_mode_does_not_match(router, command):
+    assert router.resolve(command) == (None, command)
+
+@pytest.mark.parametrize("command", ["cantar uma canção", "ir", "falar", "", "para floresta"])
+def test_unknown_input(router, command):
+    assert router.resolve(command) == (None, command)
+
+def test_longest_fitting_alias_wins():
+    router = CommandRouter()
+    router.register("move", ["ir"], command_router.ARGUMENT)
+    router.register("move_to", ["ir para"], command_router.ARGUMENT)
+    assert router.resolve("ir para casa") == ("move_to", "casa")
+    assert router.resolve("ir casa") == ("move", "casa")
+    # "ir para" alone cannot take "para" as its argument, so "ir" does
+    assert router.resolve("ir para") == ("move", "para")
+
+def test_depth_is_bounded_by_the_longest_alias():
+    router = CommandRouter()
+    router.register("a", ["um dois tres"])
+    assert router.max_depth == 3
+    assert router.resolve("um dois tres") == ("a", "")
+    assert router.resolve("um dois") == (None, "um dois")
@@ -0,0 +1,76 @@
+import pytest
+
+from entity_index import EntityIndex, fold, trigrams
+
+@pytest.fixture
+def index():
+    index = EntityIndex(threshold=0.3)
+    index.add("dark_forest", "Floresta Sombria", ["mata escura"])
+    index.add("village", "Vila de Pedra")
+    index.add("blacksmith", "Ferreiro Gorim", ["ferreiro"])
+    index.add("forest_shrine", "Santuário da Floresta")
+    return index
+
+def test_fold_lowercases_and_strips_accents_and_separators():
+    assert fold("  Santuário_da-FLORESTA! ") == "santuario da floresta"
+    assert fold(None) == ""
+
+def test_trigrams_pad_each_word():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+@pytest.mark.parametrize("text,expected", [
+    ("floresta sombria", "dark_forest"),
+    ("dark_forest", "dark_forest"),
+    ("mata escura", "dark_forest"),
+    ("ferreiro", "blacksmith"),
+    ("Vila de Pedra", "village"),
+])
+def test_exact_names_ids_and_aliases(index, text, expected):
+    assert index.resolve(text) == expected
+
+@pytest.mark.parametrize("text,expected", [
+    ("FLORESTA SOMBRÍA", "dark_forest"),
+    ("santuario da floresta", "forest_shrine"),
+    ("Santuário-da-Floresta", "forest_shrine"),
+])
+def test_accent_and_case_folded(index, text, expected):
+    assert index.resolve(text) == expected
+
+@pytest.mark.parametrize("text,expected", [
+    ("flroesta sombria", "dark_forest"),
+    ("ferrero", "blacksmith"),
+    ("vila de pedar", "village"),
+    ("santuaro", "forest_shrine"),
+])
+def test_typos_resolve_by_trigram_similarity(index, text, expected):
+    assert index.resolve(text) == expected
+
+def test_fuzzy_can_be_disabled(index):
+    assert index.resolve("ferrero", fuzzy=False) is None
+
+def test_unrelated_names_resolve_to_nothing(index):
+    assert index.resolve("castelo de gelo") is None
+    assert index.resolve("") is None
+    assert index.fuzzy("xyz") == []
+
+def test_ambiguous_word_goes_to_the_first_indexed(index):
+    # "floresta" is a word of both Floresta Sombria and Santuário da Floresta
+    assert index.resolve("floresta") == "dark_forest"
+
+def test_candidates_narrow_ambiguous_names(index):
+    assert index.resolve("floresta", candidates={"village", "forest_shrine"}) == "forest_shrine"
+    assert index.resolve("flroesta", candidates={"forest_shrine"}) == "forest_shrine"
+    assert index.resolve("ferreiro", candidates={"village"}) is None
+
+def test_full_names_win_over_single_words():
+    index = EntityIndex()
+    index.add("old_tower", "Torre Velha")
+    index.add("tower", "Torre")
+    assert index.resolve("torre") == "tower"
+
+def test_fuzzy_ranks_best_first(index):
+    ranked = index.fuzzy("florest", limit=3)
+    assert {entity_id for entity_id, _ in ranked[:2]} == {"dark_forest", "forest_shrine"}
+    scores = [score for _, score in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.3 <= score < 1.0 for score in scores)
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+import filtering_toxicity
+from filtering_toxicity import ResponseStreamFilter, check_ai_response, safe_ai_request
+
+NARRATIONS = [
+    "O ferreiro sorri e entrega a espada ao aventureiro.",
+    "Que droga, a tortura do prisioneiro termina.",
+    "Que droga, o bobo viu a tortura e o sangue jorrando.",
+    "Bobo! Bobo! A agonia excruciante do bobo ecoa.",
+]
+
+@pytest.fixture
+def terms(filter_terms_store):
+    filtering_toxicity.update_filter_database("bobo", "medium")
+    filtering_toxicity.update_filter_database("droga", "low")
+    filtering_toxicity.update_filter_database("maldito", "high")
+
+def _stream(text, size):
+    moderation = ResponseStreamFilter()
+    parts = [moderation.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    parts.append(moderation.finish())
+    return moderation, "".join(parts)
+
+@pytest.mark.parametrize("text", NARRATIONS)
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_stream_and_batch_censor_alike(terms, text, size):
+    appropriate, filtered = check_ai_response(text)
+    moderation, streamed = _stream(text, size)
+    assert not moderation.blocked
+    assert streamed == filtered
+    assert moderation.flagged == (not appropriate)
+
+def test_high_severity_blocks_both(terms):
+    text = "O maldito goblin ri."
+    assert check_ai_response(text) == (False, filtering_toxicity.BLOCKED_RESPONSE)
+    moderation, streamed = _stream(text, 4)
+    assert moderation.blocked
+
+def test_safe_ai_request_returns_moderated_text(terms):
+    narration = "Que droga, a tortura do prisioneiro termina."
+    result = safe_ai_request("olhar ao redor", lambda prompt: narration)
+    assert result == check_ai_response(narration)[1]
+    assert "droga" not in result and "tortura" not in result
+
+def test_random_chunking_matches_batch(terms):
+    # Overlapping terms and split points anywhere in the text
+    filtering_toxicity.update_filter_database("bobalhão", "low")
+    filtering_toxicity.update_filter_database("obo", "low")
+    rng = random.Random(0)
+    words = ["bobo", "bobalhão", "droga", "tortura", "sangue jorrando", "agonia", "o", "a", "bo", " ", ", "]
+    for _ in range(300):
+        text = "".join(rng.choice(words) for _ in range(rng.randint(0, 12)))
+        appropriate, filtered = check_ai_response(text)
+        moderation = ResponseStreamFilter()
+        parts, start = [], 0
+        while start < len(text):
+            size = rng.randint(1, 8)
+            parts.append(moderation.feed(text[start:start + size]))
+            start += size
+        parts.append(moderation.finish())
+        assert "".join(parts) == filtered, text
+        assert moderation.flagged == (not appropriate), text
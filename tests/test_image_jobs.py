@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import image_jobs
+from image_jobs import ImageJobQueue, DONE, FAILED, PENDING
+from local_store import LocalDatabase
+
+PLACEHOLDER = "/static/placeholder.svg"
+
+@pytest.fixture
+def make_queue(tmp_path):
+    def make(generate):
+        database = LocalDatabase("image_jobs.db", image_jobs.JOB_SCHEMA)
+        database.path = str(tmp_path / "image_jobs.db")
+        queue = ImageJobQueue(generate, PLACEHOLDER, database=database, workers=1)
+        queue._started_pid = os.getpid()  # Jobs are processed by the test, not by threads
+        finished = []
+        queue.add_listener(finished.append)
+        return queue, finished
+    return make
+
+def _run_once(queue):
+    job = queue._claim()
+    assert job is not None
+    queue._process(job)
+    return job
+
+def test_generated_image_finishes_the_job(make_queue):
+    queue, finished = make_queue(lambda prompt: "/assets/images/abc.png")
+    job_id = queue.enqueue("floresta", image_id=7)
+    _run_once(queue)
+    assert queue.get(job_id)["status"] == DONE
+    assert finished == [{"id": job_id, "image_id": 7, "status": DONE, "image_url": "/assets/images/abc.png"}]
+
+def test_placeholder_is_retried_then_fails(make_queue):
+    calls = []
+    queue, finished = make_queue(lambda prompt: calls.append(prompt) or PLACEHOLDER)
+    job_id = queue.enqueue("floresta", image_id=7)
+
+    for attempt in range(1, image_jobs.JOB_CONFIG["max_attempts"]):
+        _run_once(queue)
+        assert queue.get(job_id)["status"] == PENDING
+        assert finished == []
+    _run_once(queue)
+
+    assert len(calls) == image_jobs.JOB_CONFIG["max_attempts"]
+    assert queue.get(job_id)["status"] == FAILED
+    assert [job["status"] for job in finished] == [FAILED]
+
+def test_retry_after_placeholder_can_succeed(make_queue):
+    results = iter([PLACEHOLDER, "/assets/images/def.png"])
+    queue, finished = make_queue(lambda prompt: next(results))
+    job_id = queue.enqueue("floresta")
+    _run_once(queue)
+    _run_once(queue)
+    assert queue.get(job_id) == {"id": job_id, "image_id": None, "status": DONE, "image_url": "/assets/images/def.png"}
@@ -0,0 +1,155 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+import inventory_system
+import migrations
+from inventory_system import (
+    InventoryAccessor, add_item, equip_item, get_item_data, initialize_inventory, pack_inventory, unequip_item,
+    unpack_inventory
+)
+from models import Base, EquippedSlot, GameState, InventoryItem
+
+def _round_trip(inventory):
+    inventory, upgraded = unpack_inventory(pack_inventory(inventory))
+    assert not upgraded
+    return inventory
+
+def _worn_sword():
+    inventory = initialize_inventory()
+    inventory, _ = add_item(inventory, "espada_simples")
+    inventory, _ = add_item(inventory, "arco_curto")
+    inventory["items"]["espada_simples"]["stats"] = {"durability": 3}
+    return inventory
+
+def test_equipped_item_keeps_its_stats():
+    inventory, _, _ = equip_item(_worn_sword(), "espada_simples")
+    inventory = _round_trip(inventory)
+    assert "espada_simples" not in inventory["items"]
+    assert get_item_data(inventory, "espada_simples", "weapon")["stats"]["durability"] == 3
+    assert get_item_data(inventory, "espada_simples", "weapon")["stats"]["damage"] == \
+        inventory_system.BASE_ITEMS["espada_simples"]["stats"]["damage"]
+
+def test_swapping_weapons_restores_the_stats():
+    inventory, _, _ = equip_item(_worn_sword(), "espada_simples")
+    inventory, _, _ = equip_item(_round_trip(inventory), "arco_curto")
+    inventory = _round_trip(inventory)
+    assert inventory["equipped"]["weapon"] == "arco_curto"
+    assert inventory["items"]["espada_simples"] == {"quantity": 1, "stats": {"durability": 3}}
+    assert "equipped_stats" not in inventory
+
+def test_unequip_item():
+    inventory, _, _ = equip_item(_worn_sword(), "espada_simples")
+    inventory, unequipped = unequip_item(inventory, "weapon")
+    assert unequipped
+    assert inventory["equipped"]["weapon"] is None
+    assert get_item_data(inventory, "espada_simples")["stats"]["durability"] == 3
+    assert unequip_item(inventory, "weapon") == (inventory, False)
+
+def test_stat_deltas_apply_to_use_item():
+    inventory = initialize_inventory()
+    inventory, _ = add_item(inventory, "pocao_cura_menor", 2)
+    inventory["items"]["pocao_cura_menor"]["stats"] = {"health_restore": 77}
+    inventory, stats, _ = inventory_system.use_item(_round_trip(inventory), "pocao_cura_menor", {"health": 10, "mana": 0})
+    assert stats["health"] == 87
+    assert inventory["items"]["pocao_cura_menor"]["quantity"] == 1
+
+# InventoryAccessor against the inventory tables
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def _legacy_game_state(session, inventory):
+    game_state = GameState(character_id=1, current_location="vila_inicial", inventory=json.dumps(inventory))
+    session.add(game_state)
+    session.commit()
+    return game_state
+
+def _reload(session, game_state):
+    session.commit()
+    session.expire_all()
+    return InventoryAccessor(session.get(GameState, game_state.id))
+
+def test_legacy_json_moves_to_the_tables(session):
+    legacy = _worn_sword()
+    legacy["gold"] = 42
+    game_state = _legacy_game_state(session, legacy)
+    assert not game_state.inventory_migrated
+
+    accessor = InventoryAccessor(game_state)
+    assert accessor.data["items"]["espada_simples"]["stats"] == {"durability": 3}
+    assert accessor.flush()
+
+    assert game_state.inventory_migrated
+    assert game_state.inventory == ""
+    assert game_state.gold == 42
+    reloaded = _reload(session, game_state)
+    assert reloaded.data["items"] == legacy["items"]
+    assert reloaded.data["gold"] == 42
+    assert not reloaded.flush()  # Nothing changed since the read
+
+def test_equipped_stats_survive_the_flush(session):
+    game_state = _legacy_game_state(session, _worn_sword())
+    accessor = InventoryAccessor(game_state)
+    equip_item(accessor.data, "espada_simples")
+    accessor.mark_dirty()
+    accessor.flush()
+
+    row = session.execute(select(EquippedSlot)).scalar_one()
+    assert (row.slot, row.item_id, json.loads(row.stats)) == ("weapon", "espada_simples", {"durability": 3})
+    assert session.execute(
+        select(InventoryItem.item_id).where(InventoryItem.game_state_id == game_state.id)
+    ).scalars().all() == ["arco_curto"]
+
+    reloaded = _reload(session, game_state)
+    assert reloaded.data["equipped_stats"] == {"weapon": {"durability": 3}}
+
+    # Unequipping merges the row back into a carried stack with its stats
+    equip_item(reloaded.data, "arco_curto")
+    reloaded.mark_dirty()
+    reloaded.flush()
+    final = _reload(session, game_state)
+    assert final.data["equipped"]["weapon"] == "arco_curto"
+    assert final.data["items"]["espada_simples"] == {"quantity": 1, "stats": {"durability": 3}}
+    assert session.execute(select(EquippedSlot.stats)).scalar_one() is None
+
+def test_invalid_legacy_json_is_replaced(session):
+    game_state = GameState(character_id=1, current_location="vila_inicial", inventory="{not json")
+    session.add(game_state)
+    session.commit()
+    accessor = InventoryAccessor(game_state)
+    assert accessor.data == initialize_inventory(1)
+    assert accessor.flush()
+    assert _reload(session, game_state).data["gold"] == initialize_inventory()["gold"]
+
+def test_migrate_inventory_to_tables(session):
+    game_states = [_legacy_game_state(session, _worn_sword()) for _ in range(3)]
+    assert migrations.migrate_inventory_to_tables(session, batch_size=2) == 3
+    assert all(game_state.inventory_migrated for game_state in game_states)
+    assert migrations.migrate_inventory_to_tables(session) == 0
+
+def test_upgrade_flags_inventories_moved_before_the_flag(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE game_state (id INTEGER PRIMARY KEY, character_id INTEGER, current_location VARCHAR(64), "
+            "inventory TEXT, quest_progress TEXT, gold INTEGER, current_weight INTEGER, max_weight INTEGER, "
+            "created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO game_state (id, character_id, current_location, inventory, gold) VALUES "
+                          "(1, 1, 'vila_inicial', '', 10), (2, 2, 'vila_inicial', '{}', NULL)"))
+        conn.execute(text("CREATE TABLE equipped_slot (game_state_id INTEGER, slot VARCHAR(16), item_id VARCHAR(64), "
+                          "PRIMARY KEY (game_state_id, slot))"))
+
+    migrations.upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        flags = conn.execute(text("SELECT id, inventory_migrated FROM game_state ORDER BY id")).all()
+        assert [(row[0], bool(row[1])) for row in flags] == [(1, True), (2, False)]
+        conn.execute(text("SELECT stats FROM equipped_slot"))
@@ -0,0 +1,37 @@
+import threading
+
+import ai_pipeline
+import metrics
+
+def test_spans_of_parallel_calls_count_for_the_request():
+    def generate():
+        with metrics.span("llm"):
+            return "texto"
+
+    metrics.begin_request("create_character")
+    results = ai_pipeline.run_parallel({"a": (generate, None), "b": (generate, None)}, deadline=5)
+    timer = metrics.end_request()
+
+    assert results == {"a": "texto", "b": "texto"}
+    assert timer.spans["llm"][1] == 2
+    assert "llm;dur=" in metrics.server_timing(timer)
+
+def test_concurrent_adds_are_all_counted():
+    timer = metrics.RequestTimer("test")
+
+    def add_many():
+        for _ in range(1000):
+            timer.add("llm", 0.001)
+
+    threads = [threading.Thread(target=add_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert timer.snapshot()["llm"][1] == 8000
+
+def test_spans_after_the_request_finished_are_dropped():
+    metrics.begin_request("test")
+    timer = metrics.end_request()
+    timer.add("llm", 1.0)
+    assert "llm" not in timer.snapshot()
@@ -0,0 +1,184 @@
+import threading
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, ProviderUnavailable, ResilientProvider, TokenBucket
+
+class FakeTime:
+    """Stands in for the time module: sleep() advances monotonic() instantly."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class FakeProvider:
+    name = "fake"
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def complete(self, messages, model, temperature, max_tokens=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else ("texto", 1)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def test_breaker_opens_after_the_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+def test_breaker_half_opens_after_the_reset_timeout_and_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # One trial at a time
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": CircuitBreaker.CLOSED, "consecutive_failures": 0}
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_trial_reopens_for_a_full_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    breaker.state, breaker.opened_at = CircuitBreaker.OPEN, clock.now
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()  # A half-open failure reopens below the threshold
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+def test_released_trial_lets_another_caller_try(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.allow()
+
+def test_bucket_allows_the_burst_then_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert all(bucket.acquire(0) for _ in range(3))
+    assert not bucket.acquire(0)
+    assert bucket.acquire(1)
+    assert clock.slept == [pytest.approx(0.5)]
+    clock.now += 100
+    assert sum(bucket.acquire(0) for _ in range(10)) == 3  # Refill stops at the burst
+
+def test_bucket_gives_up_without_waiting_past_the_timeout(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    bucket.penalize(4)
+    assert not bucket.acquire(2)
+    assert clock.slept == []
+    clock.now += 5
+    assert bucket.acquire(0)
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "failure_threshold", 2)
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "reset_timeout", 30)
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "max_retries", 0)
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+
+def test_provider_fails_fast_while_open_and_recovers(clock, config):
+    provider = FakeProvider(ConnectionError(), ConnectionError())
+    resilient = ResilientProvider(provider)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            resilient.complete([], "m", 0.7)
+    with pytest.raises(ProviderUnavailable):
+        resilient.complete([], "m", 0.7)
+    assert provider.calls == 2
+    assert resilient.state()["chat"]["state"] == CircuitBreaker.OPEN
+
+    clock.now += 30
+    assert resilient.complete([], "m", 0.7) == ("texto", 1)
+    state = resilient.state()["chat"]
+    assert state["state"] == CircuitBreaker.CLOSED
+    assert state["rejected"] == 1 and state["failures"] == 2 and state["calls"] == 3
+
+def test_bad_requests_do_not_open_the_breaker(clock, config):
+    resilient = ResilientProvider(FakeProvider(StatusError(400), StatusError(400), StatusError(400)))
+    for _ in range(3):
+        with pytest.raises(StatusError):
+            resilient.complete([], "m", 0.7)
+    assert resilient.state()["chat"]["state"] == CircuitBreaker.CLOSED
+
+def test_transient_errors_are_retried_with_backoff(clock, config, monkeypatch):
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "max_retries", 2)
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "failure_threshold", 5)  # Retries count as failures
+    provider = FakeProvider(StatusError(503), StatusError(503))
+    resilient = ResilientProvider(provider)
+    assert resilient.complete([], "m", 0.7) == ("texto", 1)
+    assert provider.calls == 3
+    assert clock.slept == [0.5, 1.0]
+    assert resilient.state()["chat"]["retries"] == 2
+
+def test_throttling_drains_the_bucket(clock, config):
+    resilient = ResilientProvider(FakeProvider(StatusError(429)))
+    with pytest.raises(StatusError):
+        resilient.complete([], "m", 0.7)
+    assert resilient.guards["chat"].bucket.tokens < 0
+
+def test_rate_limit_rejects_past_the_acquire_timeout(clock, config, monkeypatch):
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG["endpoints"], "chat", {"rate": 1, "burst": 2, "concurrency": 8})
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "acquire_timeout", 0.5)
+    resilient = ResilientProvider(FakeProvider())
+    resilient.complete([], "m", 0.7)
+    resilient.complete([], "m", 0.7)
+    with pytest.raises(ProviderUnavailable, match="rate limit"):
+        resilient.complete([], "m", 0.7)
+    clock.now += 1
+    assert resilient.complete([], "m", 0.7) == ("texto", 1)
+
+def test_concurrency_cap_rejects_extra_calls(clock, config, monkeypatch):
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG["endpoints"], "chat", {"rate": 100, "burst": 100, "concurrency": 1})
+    monkeypatch.setitem(resilience.RESILIENCE_CONFIG, "acquire_timeout", 0.05)
+    entered, release = threading.Event(), threading.Event()
+
+    class BlockingProvider(FakeProvider):
+        def complete(self, *args):
+            entered.set()
+            release.wait(5)
+            return "texto", 1
+
+    resilient = ResilientProvider(BlockingProvider())
+    worker = threading.Thread(target=resilient.complete, args=([], "m", 0.7))
+    worker.start()
+    assert entered.wait(5)
+    assert resilient.state()["chat"]["in_flight"] == 1
+    with pytest.raises(ProviderUnavailable, match="concurrency"):
+        resilient.complete([], "m", 0.7)
+    release.set()
+    worker.join()
+    assert resilient.state()["chat"]["in_flight"] == 0
@@ -0,0 +1,80 @@
+import pytest
+
+import scene_assets
+from local_store import LocalDatabase
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scene_assets.time, "monotonic", clock.monotonic)
+    return clock
+
+@pytest.fixture
+def scenes(tmp_path, clock):
+    database = LocalDatabase("scene_assets.db", scene_assets.SCENE_SCHEMA)
+    database.path = str(tmp_path / "scene_assets.db")
+    scenes = scene_assets.SceneAssets(database)
+    scenes.load()
+    return scenes
+
+def count_loads(scenes, monkeypatch):
+    loads = []
+    load = scenes.load
+    monkeypatch.setattr(scenes, "load", lambda: (loads.append(1), load()))
+    return loads
+
+def add_scene(scenes, location, time_of_day):
+    scenes.database.execute(
+        "INSERT INTO scene_assets (location, time_of_day, description, image_url, created_at) VALUES (?, ?, ?, ?, 0)",
+        (location, time_of_day, "descrição", "/assets/images/x.png")
+    )
+
+def test_reloads_back_off_while_nothing_changes(scenes, clock, monkeypatch):
+    loads = count_loads(scenes, monkeypatch)
+    location, time_of_day = scenes.all_scenes()[0]
+    base = scene_assets.SCENE_CONFIG["refresh_interval"]
+
+    for _ in range(100):
+        assert scenes.get(location, time_of_day) is None
+    assert loads == []
+
+    reload_times = []
+    for _ in range(2000):
+        clock.now += 1
+        before = len(loads)
+        scenes.get(location, time_of_day)
+        if len(loads) > before:
+            reload_times.append(clock.now)
+    gaps = [b - a for a, b in zip(reload_times, reload_times[1:])]
+    assert gaps[0] > base
+    assert gaps == sorted(gaps)
+    assert max(gaps) == pytest.approx(scene_assets.SCENE_CONFIG["max_refresh_interval"], abs=1)
+
+def test_a_new_scene_resets_the_backoff(scenes, clock):
+    location, time_of_day = scenes.all_scenes()[0]
+    for _ in range(10):
+        clock.now += 1000
+        scenes.get(location, time_of_day)
+    assert scenes._refresh_interval == scene_assets.SCENE_CONFIG["max_refresh_interval"]
+
+    add_scene(scenes, location, time_of_day)
+    clock.now += 1000
+    assert scenes.get(location, time_of_day)["image_url"] == "/assets/images/x.png"
+    assert scenes._refresh_interval == scene_assets.SCENE_CONFIG["refresh_interval"]
+
+def test_no_reloads_once_every_scene_is_rendered(scenes, clock, monkeypatch):
+    for location, time_of_day in scenes.all_scenes():
+        add_scene(scenes, location, time_of_day)
+    clock.now += 1000
+    scenes.readiness()
+    loads = count_loads(scenes, monkeypatch)
+    clock.now += 1000
+    assert scenes.readiness()["rendered"] == len(scenes.all_scenes())
+    assert loads == []
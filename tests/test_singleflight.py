@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+import singleflight
+from local_store import LocalDatabase
+
+@pytest.fixture
+def database(tmp_path):
+    database = LocalDatabase("singleflight.db", singleflight.FLIGHT_SCHEMA)
+    database.path = str(tmp_path / "singleflight.db")
+    return database
+
+def test_local_followers_share_the_leader_result(database):
+    flight = singleflight.SingleFlight("test", database, cross_worker=False)
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "resultado"
+
+    leader = threading.Thread(target=flight.do, args=("k", slow))
+    leader.start()
+    time.sleep(0.05)
+    results = []
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow, timeout=5)))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["resultado"]
+    assert len(calls) == 1
+
+def test_local_follower_takes_the_fallback_at_its_deadline(database):
+    flight = singleflight.SingleFlight("test", database, cross_worker=False)
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("k", lambda: release.wait(5)))
+    leader.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    result = flight.do("k", lambda: "nunca", timeout=0.2, fallback="reserva")
+    assert result == "reserva"
+    assert time.monotonic() - started < 1
+    release.set()
+    leader.join()
+
+def test_cross_worker_follower_takes_the_fallback_at_its_deadline(database, monkeypatch):
+    flight = singleflight.SingleFlight("test", database, cross_worker=True)
+    # Another worker holds the lock and never publishes
+    monkeypatch.setattr(singleflight.SingleFlight, "_owner", "other-worker")
+    assert flight._acquire("test:k")
+    monkeypatch.undo()
+
+    started = time.monotonic()
+    result = flight.do("k", lambda: "nunca", timeout=0.3, fallback="reserva")
+    assert result == "reserva"
+    assert time.monotonic() - started < 1.5
+
+def test_cross_worker_leader_publishes_for_followers(database):
+    flight = singleflight.SingleFlight("test", database, cross_worker=True)
+    assert flight.do("k", lambda: {"texto": "ok"}, timeout=1) == {"texto": "ok"}
+    assert flight._published_result("test:k", 0) == {"texto": "ok"}
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from term_matcher import TermMatcher
+
+TERMS = [("he", "low"), ("she", "medium"), ("his", "low"), ("hers", "high"), ("s", "violence"), ("ab", "low"), ("b", "medium")]
+
+def brute_force(text, terms):
+    found = set()
+    lowered = text.lower()
+    for term, label in terms:
+        start = lowered.find(term)
+        while start != -1:
+            found.add((start, start + len(term), term, label))
+            start = lowered.find(term, start + 1)
+    return found
+
+def as_tuples(matches):
+    return {(m.start, m.end, m.term, m.label) for m in matches}
+
+def random_text(rng, length):
+    return "".join(rng.choice("hesirbaHS ") for _ in range(length))
+
+def random_chunks(rng, text):
+    chunks, start = [], 0
+    while start < len(text):
+        size = rng.randint(1, 6)
+        chunks.append(text[start:start + size])
+        start += size
+    return chunks
+
+def test_finds_overlapping_and_nested_terms():
+    matcher = TermMatcher(TERMS)
+    assert as_tuples(matcher.find("ushers")) == brute_force("ushers", TERMS)
+    assert {m.term for m in matcher.find("ushers")} == {"she", "he", "hers", "s"}
+
+def test_matching_ignores_case_and_keeps_positions():
+    matcher = TermMatcher([("matar", "violence"), ("i", "low")])
+    text = "İ vou MATAR"  # "İ" grows when lowered; positions must not shift
+    assert [(m.start, m.end) for m in matcher.find(text) if m.term == "matar"] == [(6, 11)]
+
+def test_empty_matcher_finds_nothing():
+    matcher = TermMatcher([("  ", "low")])
+    assert not matcher
+    assert matcher.find("qualquer texto") == []
+
+def test_random_texts_match_brute_force():
+    rng = random.Random(0)
+    matcher = TermMatcher(TERMS)
+    for _ in range(500):
+        text = random_text(rng, rng.randint(0, 40))
+        assert as_tuples(matcher.find(text)) == brute_force(text, TERMS), text
+
+def test_scanner_matches_across_chunk_boundaries():
+    rng = random.Random(1)
+    matcher = TermMatcher(TERMS)
+    for _ in range(500):
+        text = random_text(rng, rng.randint(0, 40))
+        scanner = matcher.scanner()
+        matches = []
+        for chunk in random_chunks(rng, text):
+            matches.extend(scanner.feed(chunk))
+            # No later match may start before the held-back tail
+            assert scanner.pending <= matcher.longest
+        assert as_tuples(matches) == as_tuples(matcher.find(text)), text
+
+def test_pending_covers_every_later_match():
+    rng = random.Random(2)
+    matcher = TermMatcher(TERMS)
+    for _ in range(300):
+        text = random_text(rng, rng.randint(1, 40))
+        scanner = matcher.scanner()
+        for chunk in random_chunks(rng, text):
+            scanner.feed(chunk)
+            safe = scanner.position - scanner.pending
+            later = [m for m in matcher.find(text) if m.end > scanner.position]
+            assert all(m.start >= safe for m in later), text
+
+@pytest.mark.parametrize("text,expected", [
+    ("ushers", "u[M]r[S]"),  # "she" starts before the overlapping "hers" and wins
+    ("she", "[M]"),  # "she" beats the shorter "s" starting at the same place
+    ("shis", "[S][L]"),  # Only "s" starts at 0; "his" then replaces the rest
+    ("abb", "[L][M]"),
+])
+def test_replace_is_leftmost_longest(text, expected):
+    matcher = TermMatcher(TERMS)
+    replacements = {"low": "[L]", "medium": "[M]", "high": "[H]", "violence": "[S]"}
+    assert TermMatcher.replace(text, matcher.find(text), replacements) == expected
+
+def test_replace_leaves_unlisted_labels_alone():
+    matcher = TermMatcher(TERMS)
+    assert TermMatcher.replace("she", matcher.find("she"), {"low": "[L]"}) == "s[L]"
@@ -0,0 +1,44 @@
+import pytest
+
+from text_normalizer import normalize
+
+@pytest.mark.parametrize("command", [
+    "ir para a taverna 10",
+    "comprar 3 flechas",
+    "vender 1000 moedas de ouro",
+    "usar poção 2 vezes",
+    "falar com o ferreiro",
+    "olhar o mapa!",
+    "voo sobre o lago",
+    "eles leem o pergaminho",
+    "assar o pão no carro",
+])
+def test_commands_keep_their_numbers_and_spelling(command):
+    expected = command.lower().replace("ç", "c").replace("ã", "a")
+    assert normalize(command) == expected
+
+@pytest.mark.parametrize("text", [
+    "matar", "MATAR", "MÁTAR", "m4tar", "M4T4R", "m@tar", "ma​tar", "maaatar", "mаtar", "mattttar",
+])
+def test_evasions_fold_to_the_plain_word(text):
+    assert normalize(text) == "matar"
+
+def test_leetspeak_only_inside_words_with_letters():
+    assert normalize("b0b0, 3 vezes") == "bobo, 3 vezes"
+    assert normalize("$angue e 5 moedas") == "sangue e 5 moedas"
+    assert normalize("ataque!!!") == "ataque!!!"
+
+def test_long_r_and_s_runs_shrink_to_two():
+    assert normalize("carrrro") == "carro"
+    assert normalize("asssssar") == "assar"
+
+def test_empty():
+    assert normalize("") == ""
+    assert normalize(None) == ""
+
+def test_filter_terms_match_obfuscated_input(filter_terms_store):
+    import filtering_toxicity
+    filtering_toxicity.update_filter_database("bobo", "medium")
+    assert not filtering_toxicity.check_player_input("seu b0b0")[0]
+    assert not filtering_toxicity.check_player_input("seu BÓBO")[0]
+    assert filtering_toxicity.check_player_input("comprar 3 flechas na taverna 10")[0]
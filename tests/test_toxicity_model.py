@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+import toxicity_model
+from toxicity_model import ToxicityClassifier
+
+TEXTS = ["", "olá aventureiro", "vou matar o dragão", "a taverna está cheia", "x"]
+
+def make_classifier(scale=1.0, bias=-0.5):
+    rng = random.Random(0)
+    buckets = 1 << 10
+    return ToxicityClassifier([rng.uniform(-scale, scale) for _ in range(buckets)], bias, buckets)
+
+def python_scores(classifier, texts, monkeypatch):
+    monkeypatch.setattr(toxicity_model, "np", None)
+    python = ToxicityClassifier(list(classifier.weights), classifier.bias, classifier.buckets, classifier.ngrams)
+    scores = python.score_batch(texts)
+    monkeypatch.undo()
+    return scores
+
+def test_extreme_logits_are_clipped_not_overflowing(monkeypatch):
+    monkeypatch.setattr(toxicity_model, "np", None)
+    classifier = ToxicityClassifier([1e6] * 64, 1e6, 64)
+    assert classifier.score("qualquer coisa") == pytest.approx(1.0)
+    classifier = ToxicityClassifier([-1e6] * 64, -1e6, 64)
+    assert 0.0 < classifier.score("qualquer coisa") < 1e-20
+    assert 0.0 < classifier.score("") < 1e-20
+
+@pytest.mark.parametrize("scale,bias", [(1.0, -0.5), (1e6, 0.0), (1e6, -1e6)])
+def test_numpy_and_python_paths_agree(scale, bias, monkeypatch):
+    pytest.importorskip("numpy")
+    classifier = make_classifier(scale, bias)
+    assert classifier.score_batch(TEXTS) == pytest.approx(python_scores(classifier, TEXTS, monkeypatch), rel=1e-9, abs=1e-30)
+
+def test_save_and_load_keep_the_scores(tmp_path):
+    classifier = make_classifier()
+    path = str(tmp_path / "model.bin")
+    classifier.save(path)
+    loaded = ToxicityClassifier.load(path)
+    assert loaded.score_batch(TEXTS) == pytest.approx(classifier.score_batch(TEXTS))
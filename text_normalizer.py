@@ -0,0 +1,93 @@
+"""
+Text Normalizer Module for the Fantasy RPG
+
+This module folds player text to the form the content filter matches on,
+so "M4TAR", "MÁTAR", "maaatar" and "matar" with a zero-width space inside
+all read "matar". The steps run once per input, in C-speed primitives:
+NFKD decomposition (skipped for ASCII text), lowercase, one str.translate
+table that drops invisible characters and the combining accents NFKD
+split off and maps confusable letters to plain ones, a second table that
+reads digits and symbols as letters only inside words that mix them with
+letters (so "taverna 10" and "3 flechas" keep their numbers), and two
+regexes that shrink runs of three or more of a letter.
+
+Filter terms go through the same function when the matchers are built,
+so both sides agree without any per-term variants.
+"""
+
+import re
+import unicodedata
+
+# Zero-width, bidi and other invisible format characters
+INVISIBLE_CHARACTERS = (
+    [0x00AD, 0x034F, 0x061C, 0x180E, 0xFEFF]
+    + list(range(0x200B, 0x2010))  # Zero-width space/joiners, LTR/RTL marks
+    + list(range(0x202A, 0x202F))  # Bidi embeddings and overrides
+    + list(range(0x2060, 0x2070))  # Word joiner, invisible operators, bidi isolates
+    + list(range(0xFE00, 0xFE10))  # Variation selectors
+)
+
+# Blocks holding the combining marks NFKD splits accents into
+COMBINING_RANGES = [(0x0300, 0x0370), (0x1AB0, 0x1B00), (0x1DC0, 0x1E00), (0x20D0, 0x2100), (0xFE20, 0xFE30)]
+
+# Lowercase look-alikes NFKD leaves alone (Cyrillic and Greek)
+CONFUSABLES = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ɡ": "g",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x", "ı": "i", "ł": "l", "ø": "o", "đ": "d", "ß": "ss"
+}
+
+# Digits and symbols standing in for letters
+LEETSPEAK = {
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s", "!": "i", "|": "l", "€": "e"
+}
+
+def _build_table():
+    table = {code: None for code in INVISIBLE_CHARACTERS}
+    for start, end in COMBINING_RANGES:
+        for code in range(start, end):
+            if unicodedata.combining(chr(code)):
+                table[code] = None
+    table.update(str.maketrans(CONFUSABLES))
+    return table
+
+_TABLE = _build_table()
+_LEET_TABLE = str.maketrans(LEETSPEAK)
+
+_LEET_SYMBOLS = re.escape("".join(c for c in LEETSPEAK if not c.isdigit()))
+_HAS_LEET = re.compile(rf"[\d{_LEET_SYMBOLS}]")
+# A word: letters and digits, plus symbols followed by one ("m@tar", not "olá!")
+_WORD = re.compile(rf"(?:[{_LEET_SYMBOLS}](?=\w)|\w)+")
+
+def _fold_leetspeak(match):
+    word = match.group()
+    if any(c.isalpha() for c in word) and _HAS_LEET.search(word):
+        return word.translate(_LEET_TABLE)
+    return word
+
+# Players stretch words ("maaatar"), but Portuguese has real double
+# letters (voo, leem, carro, assar), so only runs of three or more of a
+# letter shrink: to one, or to two for "r" and "s" (caro/carro)
+_REPEATS = re.compile(r"([^\W\d_rs])\1{2,}")
+_LONG_RS = re.compile(r"([rs])\1{2,}")
+
+def normalize(text):
+    """
+    Fold text for filter matching
+
+    Args:
+        text (str): Player input or a filter term
+
+    Returns:
+        str: The folded text; positions do not line up with the original
+    """
+    if not text:
+        return ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+    text = text.lower().translate(_TABLE)
+    if _HAS_LEET.search(text):
+        text = _WORD.sub(_fold_leetspeak, text)
+    return _LONG_RS.sub(r"\1\1", _REPEATS.sub(r"\1", text))
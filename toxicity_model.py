@@ -0,0 +1,211 @@
+"""
+Toxicity Model Module for the Fantasy RPG
+
+This module scores texts with a small linear classifier that runs in
+process, as a second stage behind the keyword filter. Texts are folded
+by text_normalizer, turned into hashed character n-grams (no vocabulary
+to ship) and scored by logistic regression. The weights are trained
+offline from a labelled Portuguese corpus with `flask train-toxicity` and
+stored in a compact file: a JSON header line followed by float32 weights.
+
+Batches are scored with vectorized NumPy when it is installed, and with
+plain Python otherwise; both paths clip logits the same way and give the
+same scores. NumPy is optional and the filter scores one text per call,
+so plain Python is the usual path. Without a weights file the classifier
+is off and only the keyword filter runs.
+"""
+
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import logging
+import threading
+from array import array
+
+from text_normalizer import normalize
+
+try:
+    import numpy as np
+except ImportError:  # Optional: pure Python scoring
+    np = None
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Classifier configuration
+TOXICITY_CONFIG = {
+    "model_path": os.environ.get(
+        "TOXICITY_MODEL_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "toxicity_model.bin")
+    ),
+    "input_threshold": float(os.environ.get("TOXICITY_INPUT_THRESHOLD", 0.85)),  # Player input rejected at or above
+    "response_threshold": float(os.environ.get("TOXICITY_RESPONSE_THRESHOLD", 0.9))  # AI response replaced at or above
+}
+
+MODEL_MAGIC = "rpg-toxicity"
+LOGIT_LIMIT = 50.0  # Keeps exp() in range on both scoring paths
+DEFAULT_BUCKETS = 1 << 18
+DEFAULT_NGRAMS = (2, 4)
+
+def hashed_features(text, buckets=DEFAULT_BUCKETS, ngrams=DEFAULT_NGRAMS):
+    """
+    Get the hashed character n-grams of a text
+
+    Args:
+        text (str): The text, already passed through normalize()
+        buckets (int): Size of the hashed feature space
+        ngrams (tuple): (shortest, longest) n-gram length
+
+    Returns:
+        list: Bucket indices, one per n-gram occurrence
+    """
+    padded = f" {' '.join(text.split())} "
+    features = []
+    for n in range(ngrams[0], ngrams[1] + 1):
+        for i in range(len(padded) - n + 1):
+            # crc32 is stable across processes, unlike hash()
+            features.append(zlib.crc32(padded[i:i + n].encode("utf-8")) % buckets)
+    return features
+
+class ToxicityClassifier:
+    """Logistic regression over hashed character n-grams."""
+
+    def __init__(self, weights, bias, buckets=DEFAULT_BUCKETS, ngrams=DEFAULT_NGRAMS):
+        self.buckets = buckets
+        self.ngrams = tuple(ngrams)
+        self.bias = bias
+        self.weights = np.asarray(weights, dtype=np.float32) if np is not None else array("f", weights)
+
+    @classmethod
+    def load(cls, path):
+        """Read a weights file written by save()."""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("magic") != MODEL_MAGIC:
+                raise ValueError(f"Not a toxicity model: {path}")
+            data = f.read()
+        weights = array("f")
+        weights.frombytes(data)
+        if sys.byteorder != "little":
+            weights.byteswap()
+        if len(weights) != header["buckets"]:
+            raise ValueError(f"Expected {header['buckets']} weights, found {len(weights)}")
+        return cls(weights, header["bias"], header["buckets"], header["ngrams"])
+
+    def save(self, path):
+        """Write the header line and the float32 weights."""
+        header = {"magic": MODEL_MAGIC, "buckets": self.buckets, "ngrams": list(self.ngrams), "bias": self.bias}
+        weights = array("f", self.weights.tolist() if np is not None else self.weights)
+        if sys.byteorder != "little":
+            weights.byteswap()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(weights.tobytes())
+
+    def score_batch(self, texts, normalized=False):
+        """
+        Score several texts at once
+
+        Args:
+            texts (list): The texts
+            normalized (bool): The texts were already passed through normalize()
+
+        Returns:
+            list: Probability (0-1) that each text is toxic
+        """
+        if not normalized:
+            texts = [normalize(text) for text in texts]
+        features = [hashed_features(text, self.buckets, self.ngrams) for text in texts]
+        if np is None:
+            return [self._score_python(text_features) for text_features in features]
+
+        # One gather and one segmented sum for the whole batch
+        lengths = np.fromiter((len(f) for f in features), dtype=np.int64, count=len(features))
+        if not lengths.any():
+            return [self._score_python([])] * len(texts)
+        indices = np.fromiter((i for f in features for i in f), dtype=np.int64, count=int(lengths.sum()))
+        sums = np.zeros(len(texts), dtype=np.float64)
+        nonempty = lengths > 0
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[nonempty]
+        sums[nonempty] = np.add.reduceat(self.weights[indices], starts, dtype=np.float64)
+        logits = np.clip(self.bias + sums / np.sqrt(np.maximum(lengths, 1)), -LOGIT_LIMIT, LOGIT_LIMIT)
+        return (1.0 / (1.0 + np.exp(-logits))).tolist()
+
+    def _score_python(self, features):
+        total = sum(self.weights[i] for i in features)
+        logit = self.bias + total / math.sqrt(max(len(features), 1))
+        return 1.0 / (1.0 + math.exp(-max(min(logit, LOGIT_LIMIT), -LOGIT_LIMIT)))
+
+    def score(self, text, normalized=False):
+        """Return the probability (0-1) that one text is toxic."""
+        return self.score_batch([text], normalized)[0]
+
+def train(examples, buckets=DEFAULT_BUCKETS, ngrams=DEFAULT_NGRAMS, epochs=5, learning_rate=0.5, l2=1e-6):
+    """
+    Fit a classifier with stochastic gradient descent
+
+    Args:
+        examples (list): (text, label) pairs, label 1 for toxic and 0 for fine
+        buckets (int): Size of the hashed feature space
+        ngrams (tuple): (shortest, longest) n-gram length
+        epochs (int): Passes over the examples
+        learning_rate (float): SGD step size
+        l2 (float): L2 regularization strength
+
+    Returns:
+        ToxicityClassifier: The trained classifier
+    """
+    weights = [0.0] * buckets
+    bias = 0.0
+    prepared = []
+    for text, label in examples:
+        features = hashed_features(normalize(text), buckets, ngrams)
+        prepared.append((features, 1.0 / math.sqrt(max(len(features), 1)), float(label)))
+
+    rng = random.Random(0)
+    for epoch in range(epochs):
+        rng.shuffle(prepared)
+        loss = 0.0
+        for features, scale, label in prepared:
+            logit = max(min(bias + scale * sum(weights[i] for i in features), LOGIT_LIMIT), -LOGIT_LIMIT)
+            predicted = 1.0 / (1.0 + math.exp(-logit))
+            loss -= math.log(max(predicted if label else 1.0 - predicted, 1e-12))
+            gradient = predicted - label
+            bias -= learning_rate * gradient
+            step = learning_rate * gradient * scale
+            for i in features:
+                weights[i] -= step + learning_rate * l2 * weights[i]
+        logger.info(f"Epoch {epoch + 1}/{epochs}: log loss {loss / max(len(prepared), 1):.4f}")
+    return ToxicityClassifier(weights, bias, buckets, ngrams)
+
+_classifier = None
+_loaded = False
+_load_lock = threading.Lock()
+
+def get_classifier():
+    """
+    Return the process-wide classifier, loading the weights on first use
+
+    Returns:
+        ToxicityClassifier: The classifier, or None without a weights file
+    """
+    global _classifier, _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                path = TOXICITY_CONFIG["model_path"]
+                if os.path.exists(path):
+                    try:
+                        _classifier = ToxicityClassifier.load(path)
+                        logger.info(f"Loaded toxicity model from {path} ({'NumPy' if np is not None else 'pure Python'} scoring)")
+                    except Exception as e:
+                        logger.error(f"Error loading toxicity model: {e}")
+                else:
+                    logger.info("No toxicity model found; using the keyword filter only")
+                _loaded = True
+    return _classifier